@@ -5,29 +5,331 @@ and calls MCP tools to manage Mac applications
 """
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+import atexit
+import collections
+import concurrent.futures
+import copy
+import importlib.util
+import logging
+import orjson
+import selectors
 import subprocess
 import sys
+import threading
 import os
+import re
+import time
 
 MCP_SERVER_PATH = os.path.join(os.path.dirname(__file__), "src", "server.py")
+# Run the server with the same interpreter as the client, so it sees the same packages
+_SERVER_CMD = [sys.executable, MCP_SERVER_PATH]
+# Number of last server stderr lines kept for error messages
+_STDERR_TAIL_LINES = 20
 OLLAMA_API_URL = "http://localhost:11434"
 OLLAMA_MODEL = "llama3.2"
+# How long Ollama keeps the model loaded after a request
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+logger = logging.getLogger(__name__)
+
+# One HTTP session for all Ollama calls, so the connection stays open
+# (keep-alive) between queries instead of being set up for each request
+_SESSION = requests.Session()
+_SESSION.mount(
+    "http://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+)
+
+# Patterns used by extract_search_query, compiled once at import.
+# One alternation covers "find/search (for)/look up X (in google)",
+# "search google for X" and "google X", so the query is scanned once.
+_EXTRACT_QUERY = re.compile(
+    r'(?:\b(?:find|search(?:\s+for)?|look\s+up)\s+(?:google\s+(?:for\s+)?)?'
+    r'|\bgoogle\s+(?:for\s+)?)'
+    r'(?P<query>.+?)(?:\s+in\s+google\b.*)?\s*$',
+    re.IGNORECASE
+)
+# Deterministic routes for the most common commands. A query that matches
+# one of them is sent straight to the MCP tool, skipping the Ollama call.
+# Each entry is (pattern, function(match) -> (tool_name, arguments)).
+_END = r'\s*[.!?]*\s*$'
+# Application name of open/close routes. Anything that reads like more than
+# one app name is left to the model: a determiner ("close all windows",
+# "close this window") or a chained command ("quit Safari and open Mail").
+# Politeness around the name ("please", "for me", "now") is not part of it.
+_APP = (r'(?!(?:the|a|an|all|my|this|that|these|those|it)\b)(?!.*(?:\s+and\s+|\bthen\b))(?P<app>.+?)'
+        r'(?:\s*,?\s+(?:please|for\s+me|now))*' + _END)
+_PLEASE = r'^\s*(?:please\s+)?'
+_FAST_ROUTES = [
+    (
+        re.compile(r'^\s*(?:what|which)\s+(?:apps|applications)\s+are\s+(?:running|open)' + _END
+                   + r'|^\s*(?:list|show)\s+(?:the\s+)?running\s+(?:apps|applications)' + _END,
+                   re.IGNORECASE),
+        lambda match: ("get_running_applications", {}),
+    ),
+    (
+        re.compile(r'^\s*(?:find|search(?:\s+for)?|look\s+up)\s+(?P<query>.+?)\s+in\s+google' + _END
+                   + r'|^\s*(?:search\s+)?google\s+(?:for\s+)?(?P<query2>.+?)' + _END,
+                   re.IGNORECASE),
+        lambda match: ("search_google_in_safari",
+                       {"query": match["query"] or match["query2"]}),
+    ),
+    (
+        re.compile(r'^\s*create\s+collection\s+(?P<collection>\S+)\s+in\s+database\s+(?P<database>\S+)' + _END,
+                   re.IGNORECASE),
+        lambda match: ("mongodb_create_collection",
+                       {"databaseName": match["database"], "collectionName": match["collection"]}),
+    ),
+    (
+        re.compile(r'^\s*create\s+database\s+(?P<database>\S+)' + _END, re.IGNORECASE),
+        lambda match: ("mongodb_create_database", {"databaseName": match["database"]}),
+    ),
+    (
+        # "open X in Y" is a file/URL, not an application name
+        re.compile(_PLEASE + r'(?:open|launch)\s+(?!.*\s+in\s+)' + _APP, re.IGNORECASE),
+        lambda match: ("open_application", {"appName": match["app"]}),
+    ),
+    (
+        re.compile(_PLEASE + r'(?:close|quit)\s+' + _APP, re.IGNORECASE),
+        lambda match: ("quit_application", {"appName": match["app"]}),
+    ),
+]
+# Fallback cleanup: strips a leading "find/search (for)/look up" and a
+# trailing "in google ..." in a single substitution pass
+_FALLBACK_CLEAN = re.compile(
+    r'^(?:find|search(?:\s+for)?|look\s+up)\s+|\s+in\s+google.*$',
+    re.IGNORECASE
+)
+
+
+def _is_batch_error(response):
+    """True for an error object without id, the answer to a rejected batch"""
+    return isinstance(response, dict) and "error" in response and response.get("id") is None
+
+
+class _McpServer:
+    """
+    Long-lived MCP server process.
+
+    The server is launched once and its stdin/stdout are reused for every
+    JSON-RPC call, the same way real MCP clients talk to stdio servers.
+    MCP stdio transport is line-delimited: one request line in, one
+    response line out.
+    """
+
+    def __init__(self, timeout=10):
+        self.proc = None
+        self.timeout = timeout
+        self._id = 0
+        self._selector = None
+        # Bytes read from stdout that don't yet form a complete line
+        self._buffer = b""
+        # Last stderr lines of the server, for error messages
+        self._stderr_tail = collections.deque(maxlen=_STDERR_TAIL_LINES)
+        # One request/response exchange on the pipe at a time
+        self._lock = threading.Lock()
+        # One handler for whichever process is current at exit
+        atexit.register(self._terminate)
+
+    def _terminate(self):
+        """Stops the server process if it is running"""
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+
+    def _drain_stderr(self, proc, tail):
+        """Reads server stderr until it closes, so the server never blocks on it"""
+        # Line length is capped too, so output without newlines stays bounded
+        for line in iter(lambda: proc.stderr.readline(4096), b""):
+            tail.append(line.decode(errors="replace").rstrip())
+
+    def _ensure_started(self):
+        """Launches the server process if it is not running yet"""
+        if self.proc is None or self.proc.poll() is not None:
+            self.proc = subprocess.Popen(
+                _SERVER_CMD,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            # A fresh tail per process: the old reader may still be finishing
+            self._stderr_tail = collections.deque(maxlen=_STDERR_TAIL_LINES)
+            self._stderr_reader = threading.Thread(
+                target=self._drain_stderr,
+                args=(self.proc, self._stderr_tail),
+                daemon=True
+            )
+            self._stderr_reader.start()
+            # Wait for stdout with a selector instead of communicate(),
+            # which needs reader threads and the whole output at once
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.proc.stdout, selectors.EVENT_READ)
+            self._buffer = b""
+        return self.proc
+
+    def _fail(self, error_class, message):
+        """Kills the server and raises an error with its stderr output"""
+        self.proc.kill()
+        # Let the reader pick up what the server wrote before it died
+        self._stderr_reader.join(1)
+        stderr = "\n".join(self._stderr_tail).strip()
+        self._selector.close()
+        self.proc = None
+        raise error_class(f"{message}: {stderr}" if stderr else message)
+
+    def _send(self, payload):
+        """Writes one JSON-RPC message (request or batch) as a single line"""
+        proc = self._ensure_started()
+        # The pipe is binary: orjson produces bytes that go straight to stdin
+        proc.stdin.write(orjson.dumps(payload, option=orjson.OPT_APPEND_NEWLINE))
+        proc.stdin.flush()
+        return proc
+
+    def _next_id(self):
+        self._id += 1
+        return self._id
+
+    def _read_line(self, proc, deadline):
+        """Returns next stdout line, waiting for it until deadline"""
+        # Raw reads: a buffered readline() could pull several lines into its
+        # buffer, and select() would then wait for data that has already arrived
+        fd = proc.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._selector.select(remaining):
+                self._fail(TimeoutError, "Timeout when calling MCP tool")
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                self._fail(RuntimeError, "MCP server closed the connection")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line
+
+    def _read_response(self, proc, is_match):
+        """Reads stdout lines until is_match(response) is true"""
+        # Skip anything that is not the response to this request
+        # (e.g. stray lines left over from an earlier call)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            line = self._read_line(proc, deadline)
+            try:
+                response = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+            if is_match(response):
+                return response
+
+    def call(self, method, params):
+        """Sends one JSON-RPC request and returns the matching response"""
+        with self._lock:
+            request_id = self._next_id()
+            proc = self._send({
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "method": method,
+                "params": params
+            })
+            return self._read_response(
+                proc,
+                lambda response: isinstance(response, dict) and response.get("id") == request_id
+            )
+
+    def call_batch(self, calls):
+        """
+        Sends several requests as one JSON-RPC batch (a JSON array).
+
+        Args:
+            calls (list): List of (method, params) tuples
+
+        Returns:
+            list: Responses in the same order as calls
+        """
+        if not calls:
+            # An empty array is an invalid batch: the server would answer
+            # with a single error object instead of a list
+            return []
+        with self._lock:
+            ids = [self._next_id() for _ in calls]
+            proc = self._send([
+                {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+                for request_id, (method, params) in zip(ids, calls)
+            ])
+            responses = self._read_response(
+                proc,
+                lambda response: _is_batch_error(response) or (
+                    isinstance(response, list)
+                    and any(isinstance(item, dict) and item.get("id") in ids for item in response)
+                )
+            )
+        if _is_batch_error(responses):
+            # The server rejected the batch as a whole
+            raise RuntimeError(responses["error"].get("message", "Invalid batch"))
+        by_id = {item.get("id"): item for item in responses if isinstance(item, dict)}
+        return [by_id.get(request_id, {}) for request_id in ids]
+
+
+class _InProcessServer:
+    """
+    MCP server module loaded into the client process (MCP_IN_PROCESS=1).
+
+    Requests go straight to the server's handle_request, without a child
+    process, pipes or JSON encoding. The price is isolation: a tool that
+    hangs also blocks the client, since there is no process to kill.
+    """
+
+    def __init__(self, module):
+        self.module = module
+        self._id = 0
+        self._lock = threading.Lock()
+
+    def _next_id(self):
+        with self._lock:
+            self._id += 1
+            return self._id
+
+    def call(self, method, params):
+        """Handles one JSON-RPC request and returns the response"""
+        return self.module.handle_request({
+            "jsonrpc": "2.0",
+            "id": self._next_id(),
+            "method": method,
+            "params": params
+        })
+
+    def call_batch(self, calls):
+        """Handles several requests; responses are in the same order as calls"""
+        return [self.call(method, params) for method, params in calls]
+
+
+def _create_server():
+    """Returns in-process server if MCP_IN_PROCESS is set and it loads, else the child process"""
+    if os.environ.get("MCP_IN_PROCESS"):
+        try:
+            spec = importlib.util.spec_from_file_location("mcp_mac_apps_server", MCP_SERVER_PATH)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            return _InProcessServer(module)
+        except Exception as e:
+            # e.g. pymongo is installed for the server's interpreter only
+            logger.warning("In-process MCP server is not available (%s), starting it as a process", e)
+    return _McpServer()
+
+
+_server = _create_server()
+
 
 def call_mcp_tool(tool_name, arguments):
     """
     Calls MCP tool via JSON-RPC protocol.
     
     This method implements the client side of the MCP (Model Context Protocol) protocol.
-    It launches the MCP server as a separate process and communicates with it via stdin/stdout,
-    using JSON-RPC format for message exchange.
+    The MCP server runs as a persistent child process (see _McpServer) and the client
+    communicates with it via stdin/stdout, using JSON-RPC format for message exchange.
     
     Process:
     1. Forms JSON-RPC request with tool name and its arguments
-    2. Launches MCP server as a child process
-    3. Sends request to server's stdin
-    4. Receives response from server's stdout
-    5. Parses JSON-RPC response and extracts tool execution result
+    2. Sends request to the server's stdin (the server is launched on first use)
+    3. Reads the response line from the server's stdout
+    4. Parses JSON-RPC response and extracts tool execution result
     
     Args:
         tool_name (str): Name of MCP tool to call (e.g., "open_application")
@@ -41,76 +343,15 @@ def call_mcp_tool(tool_name, arguments):
         result = call_mcp_tool("open_application", {"appName": "Safari"})
         # Returns: "Application 'Safari' successfully launched"
     """
-    # Step 1: Form JSON-RPC request
-    # JSON-RPC 2.0 is a standard protocol for remote procedure calls
-    # All MCP servers communicate in this format
-    request = {
-        "jsonrpc": "2.0",          # JSON-RPC protocol version
-        "id": 1,                   # Unique request identifier (for request-response matching)
-        "method": "tools/call",    # MCP protocol method - tool call
-        "params": {                # Call parameters
+    try:
+        response = _server.call("tools/call", {
             "name": tool_name,     # Name of tool to call
             "arguments": arguments # Arguments to pass to tool
-        }
-    }
+        })
+        return _tool_result_text(response)
     
-    try:
-        # Step 2: Launch MCP server as separate process
-        # subprocess.Popen creates new process and sets up communication channels
-        process = subprocess.Popen(
-            ["python3", MCP_SERVER_PATH],  # Command to run: python3 path/to/server.py
-            stdin=subprocess.PIPE,          # Channel for sending data to server (server's stdin)
-            stdout=subprocess.PIPE,         # Channel for reading response from server (server's stdout)
-            stderr=subprocess.PIPE,         # Channel for errors (server's stderr)
-            text=True                       # Indicate we're working with text input/output
-        )
-        
-        # Step 3: Prepare and send JSON-RPC request
-        # Convert request dictionary to JSON string
-        request_json = json.dumps(request) + "\n"  # Add newline (MCP requires \n)
-        
-        # Send request to process stdin and wait for completion
-        # communicate() sends data to stdin, waits for process completion
-        # and returns (stdout, stderr). timeout=10 means if process
-        # doesn't respond within 10 seconds, TimeoutExpired exception will be raised
-        stdout, stderr = process.communicate(input=request_json, timeout=10)
-        
-        # Step 4: Parse response from MCP server
-        # MCP server sends response in JSON-RPC format, one line = one response
-        # Go through all lines in stdout, look for valid JSON
-        for line in stdout.split('\n'):
-            if line.strip():  # Skip empty lines
-                try:
-                    # Try to parse line as JSON
-                    response = json.loads(line)
-                    
-                    # Check if response has "result" field (successful response)
-                    if "result" in response:
-                        # In MCP protocol, result contains "content" array
-                        # Each element has type (usually "text") and the text itself
-                        content = response["result"].get("content", [])
-                        if content:
-                            # Extract text from first content element
-                            # Usually content contains one element with type "text"
-                            return content[0].get("text", "")
-                    
-                    # Check if response has "error" field (error)
-                    if "error" in response:
-                        # Extract error message from JSON-RPC response
-                        error_message = response["error"].get("message", "Unknown error")
-                        return f"Error: {error_message}"
-                
-                except json.JSONDecodeError:
-                    # If line is not valid JSON, skip it
-                    # (these could be service messages or stderr output)
-                    continue
-        
-        # If we got here, didn't find valid JSON-RPC response
-        return "No response from MCP server"
-        
-    except subprocess.TimeoutExpired:
+    except TimeoutError:
         # If server didn't respond within 10 seconds
-        process.kill()  # Force kill process
         return "Timeout when calling MCP tool"
     
     except Exception as e:
@@ -118,272 +359,497 @@ def call_mcp_tool(tool_name, arguments):
         return f"Error calling MCP tool: {str(e)}"
 
 
-def list_mcp_tools():
-    """Gets list of available MCP tools"""
-    request = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "tools/list",
-        "params": {}
-    }
+def call_mcp_tools_batch(calls):
+    """
+    Calls several MCP tools in one JSON-RPC batch round trip.
+    
+    Args:
+        calls (list): List of (tool_name, arguments) tuples
     
+    Returns:
+        list: Text results in the same order as calls
+    
+    Usage example:
+        results = call_mcp_tools_batch([
+            ("open_application", {"appName": "Safari"}),
+            ("get_running_applications", {}),
+        ])
+    """
+    if not calls:
+        return []
     try:
-        process = subprocess.Popen(
-            ["node", MCP_SERVER_PATH],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        request_json = json.dumps(request) + "\n"
-        stdout, stderr = process.communicate(input=request_json, timeout=10)
-        
-        for line in stdout.split('\n'):
-            if line.strip():
-                try:
-                    response = json.loads(line)
-                    if "result" in response and "tools" in response["result"]:
-                        return response["result"]["tools"]
-                except json.JSONDecodeError:
-                    continue
-        
+        responses = _server.call_batch([
+            ("tools/call", {"name": tool_name, "arguments": arguments})
+            for tool_name, arguments in calls
+        ])
+        return [_tool_result_text(response) for response in responses]
+    
+    except TimeoutError:
+        return ["Timeout when calling MCP tool"] * len(calls)
+    
+    except Exception as e:
+        return [f"Error calling MCP tool: {str(e)}"] * len(calls)
+
+
+def _tool_result_text(response):
+    """Extracts tool execution result from a tools/call JSON-RPC response"""
+    # Check if response has "result" field (successful response)
+    if "result" in response:
+        # In MCP protocol, result contains "content" array
+        # Each element has type (usually "text") and the text itself
+        content = response["result"].get("content", [])
+        if content:
+            # Extract text from first content element
+            # Usually content contains one element with type "text"
+            return content[0].get("text", "")
+    
+    # Check if response has "error" field (error)
+    if "error" in response:
+        # Extract error message from JSON-RPC response
+        error_message = response["error"].get("message", "Unknown error")
+        return f"Error: {error_message}"
+    
+    # If we got here, didn't find valid JSON-RPC response
+    return "No response from MCP server"
+
+
+# Tool catalog and the system prompt built from it never change while the
+# server runs, so they are fetched/built once per process
+_TOOLS_CACHE = None
+_SYSTEM_PROMPT_CACHE = None
+
+# Tool calls chosen by the model, keyed by normalized request text, so a
+# repeated command is dispatched without asking Ollama again (LRU order)
+_TOOL_CALL_CACHE = collections.OrderedDict()
+_TOOL_CALL_CACHE_SIZE = 256
+
+# Background fetch of the tool list (see prefetch_mcp_tools)
+_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+_tools_future = None
+
+
+def list_mcp_tools(refresh=False):
+    """
+    Gets list of available MCP tools.
+    
+    The list is cached after the first successful call; pass refresh=True
+    to fetch it from the server again.
+    """
+    global _TOOLS_CACHE, _SYSTEM_PROMPT_CACHE
+    if _TOOLS_CACHE is not None and not refresh:
+        return _TOOLS_CACHE
+    
+    try:
+        response = _server.call("tools/list", {})
+        if "result" in response and "tools" in response["result"]:
+            _TOOLS_CACHE = response["result"]["tools"]
+            _SYSTEM_PROMPT_CACHE = None
+            return _TOOLS_CACHE
         return []
         
     except Exception as e:
-        print(f"Error getting list of tools: {e}", file=sys.stderr)
+        logger.error("Error getting list of tools: %s", e)
         return []
 
 
+def prefetch_mcp_tools():
+    """
+    Starts fetching the tool list in the background.
+    
+    Called at startup so the server launch and tools/list request overlap
+    with reading the user's request instead of delaying the first query.
+    """
+    global _tools_future
+    if _tools_future is None:
+        _tools_future = _POOL.submit(list_mcp_tools)
+
+
+def _load_ollama_model():
+    """Asks Ollama to load the model; a request without prompt only loads it"""
+    try:
+        _SESSION.post(
+            f"{OLLAMA_API_URL}/api/generate",
+            json={"model": OLLAMA_MODEL, "keep_alive": OLLAMA_KEEP_ALIVE},
+            timeout=(3, 120)
+        ).close()
+    except requests.exceptions.RequestException as e:
+        logger.debug("Ollama warm-up failed: %s", e)
+
+
+def warm_up_ollama():
+    """
+    Loads the model into Ollama in the background.
+    
+    Called at startup so loading the model weights overlaps with waiting for
+    the first request instead of delaying its answer.
+    """
+    # Daemon thread: loading may take minutes, and quitting meanwhile must
+    # not wait for it (pool workers are joined at interpreter exit)
+    threading.Thread(target=_load_ollama_model, daemon=True).start()
+
+
 def extract_search_query(user_query):
-    print(f"🔍 Extracting query from: '{user_query}'")
     """Extracts search query from user text"""
-    import re
+    logger.debug("🔍 Extracting query from: '%s'", user_query)
     if not user_query:
         return None
     
-    # Patterns for finding query (more precise, using greedy quantifier)
-    patterns = [
-        r'find\s+(.+?)\s+in\s+google',
-        r'search\s+(.+?)\s+in\s+google',
-        r'search\s+for\s+(.+?)\s+in\s+google',
-        r'look\s+up\s+(.+?)\s+in\s+google',
-        r'google\s+(.+?)$',
-    ]
-    
-    query_lower = user_query.lower()
-    for pattern in patterns:
-        match = re.search(pattern, query_lower, re.IGNORECASE)
-        if match:
-            query = match.group(1).strip()
-            # Remove extra words at the end (in case pattern captured extra)
-            query = re.sub(r'\s+in\s+google.*$', '', query, flags=re.IGNORECASE)
-            if query:
-                return query.strip()
-    
-    # If pattern with "in google" not found, try just "find X" or "search X"
-    simple_patterns = [
-        r'^find\s+(.+)$',
-        r'^search\s+(.+)$',
-        r'^search\s+for\s+(.+)$',
-        r'^look\s+up\s+(.+)$',
-    ]
-    
-    for pattern in simple_patterns:
-        match = re.search(pattern, query_lower, re.IGNORECASE)
-        if match:
-            query = match.group(1).strip()
-            # Remove "in google" if present
-            query = re.sub(r'\s+in\s+google.*$', '', query, flags=re.IGNORECASE)
-            if query:
-                return query.strip()
+    # Single pass over the query with the combined pattern
+    match = _EXTRACT_QUERY.search(user_query)
+    if match and match.group("query").strip():
+        return match.group("query").strip()
     
     # If no pattern found, return entire query, removing words "find", "search", "in google"
-    query = user_query
-    query = re.sub(r'^find\s+', '', query, flags=re.IGNORECASE)
-    query = re.sub(r'^search\s+', '', query, flags=re.IGNORECASE)
-    query = re.sub(r'^search\s+for\s+', '', query, flags=re.IGNORECASE)
-    query = re.sub(r'^look\s+up\s+', '', query, flags=re.IGNORECASE)
-    query = re.sub(r'\s+in\s+google.*$', '', query, flags=re.IGNORECASE)
-    result = query.strip() if query.strip() else None
-    return result
+    query = _FALLBACK_CLEAN.sub('', user_query).strip()
+    return query or None
 
 
-def ask_ollama_with_tools(user_query):
-    """Uses Ollama to understand the request and call appropriate MCP tools"""
-    
-    # Get list of available tools
-    tools = list_mcp_tools()
-    tools_description = "\n".join([
-        f"- {tool['name']}: {tool['description']}"
-        for tool in tools
-    ])
-    
-    # Create system prompt with tool descriptions
-    system_prompt = f"""You are an assistant that can manage Mac applications through MCP tools.
+# Static parts of the Ollama system prompt; only the tool list goes between them
+_PROMPT_PREFIX = """You are an assistant that can manage Mac applications through MCP tools.
 
 Available tools:
-{tools_description}
+"""
+
+_PROMPT_SUFFIX = """
 
 When the user asks to open an application, perform an action, or get information, determine which tool to use and return JSON in the format:
-{{
+{
     "tool": "tool_name",
-    "arguments": {{"parameter": "value"}}
-}}
+    "arguments": {"parameter": "value"}
+}
 
-If the request doesn't require using tools, just respond with regular text.
+If the request doesn't require using tools, return JSON in the format:
+{"answer": "your answer"}
 
 Examples:
-- "Open Calculator" -> {{"tool": "open_application", "arguments": {{"appName": "Calculator"}}}}
-- "What applications are running?" -> {{"tool": "get_running_applications", "arguments": {{}}}}
-- "Close Safari" -> {{"tool": "quit_application", "arguments": {{"appName": "Safari"}}}}
-- "Open MongoDB Compass" -> {{"tool": "open_application", "arguments": {{"appName": "MongoDB Compass"}}}}
-- "Create database test" -> {{"tool": "mongodb_create_database", "arguments": {{"databaseName": "test"}}}}
-- "Create collection users in database test" -> {{"tool": "mongodb_create_collection", "arguments": {{"databaseName": "test", "collectionName": "users"}}}}
-- "Find apple image in Google" -> {{"tool": "search_google_in_safari", "arguments": {{"query": "apple image"}}}}
-- "Search Google for Python" -> {{"tool": "search_google_in_safari", "arguments": {{"query": "Python"}}}}
-- "Find information about MCP in Google" -> {{"tool": "search_google_in_safari", "arguments": {{"query": "MCP"}}}}
+- "Open Calculator" -> {"tool": "open_application", "arguments": {"appName": "Calculator"}}
+- "What applications are running?" -> {"tool": "get_running_applications", "arguments": {}}
+- "Close Safari" -> {"tool": "quit_application", "arguments": {"appName": "Safari"}}
+- "Open MongoDB Compass" -> {"tool": "open_application", "arguments": {"appName": "MongoDB Compass"}}
+- "Create database test" -> {"tool": "mongodb_create_database", "arguments": {"databaseName": "test"}}
+- "Create collection users in database test" -> {"tool": "mongodb_create_collection", "arguments": {"databaseName": "test", "collectionName": "users"}}
+- "Add document {\"name\": \"John\"} to collection users in database test" -> {"tool": "mongodb_insert_document", "arguments": {"databaseName": "test", "collectionName": "users", "document": {\"name\": \"John\"}}}
+- "Find apple image in Google" -> {"tool": "search_google_in_safari", "arguments": {"query": "apple image"}}
+- "Search Google for Python" -> {"tool": "search_google_in_safari", "arguments": {"query": "Python"}}
+- "Find information about MCP in Google" -> {"tool": "search_google_in_safari", "arguments": {"query": "MCP"}}
 
 IMPORTANT: 
 - For search_google_in_safari always extract the search query from the user's text and pass it in the "query" parameter. If the user says "find X in Google" or "search Y", then query should be "X" or "Y".
-- ALWAYS return ONLY a valid JSON object in the format {{"tool": "...", "arguments": {{...}}}}. DO NOT return just text or tool name without JSON. DO NOT return empty arguments.
+- ALWAYS return ONLY a valid JSON object in the format {"tool": "...", "arguments": {...}} (or {"answer": "..."} when no tool is needed). DO NOT return just text or tool name without JSON. DO NOT return empty arguments.
 
 Respond ONLY with JSON, without additional explanations or text."""
 
+
+def get_system_prompt():
+    """Returns Ollama system prompt with descriptions of available tools (cached)"""
+    global _SYSTEM_PROMPT_CACHE
+    if _tools_future is not None:
+        # Wait for the prefetch; its result lands in _TOOLS_CACHE
+        _tools_future.result()
+    tools = list_mcp_tools()
+    if _SYSTEM_PROMPT_CACHE is not None and tools is _TOOLS_CACHE:
+        return _SYSTEM_PROMPT_CACHE
+    
+    tools_description = "\n".join([
+        f"- {tool['name']}: {tool['description']}"
+        for tool in tools
+    ])
+    
+    system_prompt = "".join((_PROMPT_PREFIX, tools_description, _PROMPT_SUFFIX))
+
+    # Only cache a prompt built from the real tool list
+    if tools is _TOOLS_CACHE:
+        _SYSTEM_PROMPT_CACHE = system_prompt
+    return system_prompt
+
+
+class _JsonObjectScanner:
+    """
+    Incremental scanner for top-level {...} spans in text.
+    
+    Text is fed in pieces (e.g. streamed model tokens); a single linear pass
+    tracks brace depth and skips braces inside JSON strings, so any nesting
+    depth is handled without regex backtracking.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        """Consumes the next piece of text and returns objects completed in it"""
+        objects = []
+        for char in text:
+            if self._depth > 0:
+                self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                # Quotes only matter inside an object
+                self._in_string = self._depth > 0
+            elif char == "{":
+                if self._depth == 0:
+                    self._buffer = [char]
+                self._depth += 1
+            elif char == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    objects.append("".join(self._buffer))
+        return objects
+
+
+def route_fast_path(user_query):
+    """
+    Matches the request against deterministic routes for common commands.
+    
+    Returns:
+        tuple: (tool_name, arguments) if a route matched, otherwise None
+    """
+    for pattern, build_call in _FAST_ROUTES:
+        match = pattern.match(user_query)
+        if match:
+            return build_call(match)
+    return None
+
+
+def _tool_call_key(user_query):
+    """Returns cache key for a request: extra whitespace and final .!? don't matter"""
+    # Case is kept: it may matter for arguments such as document values
+    return " ".join(user_query.split()).rstrip(".!? ")
+
+
+def _is_error_result(result):
+    """True for failed tool calls: server errors (isError) and transport errors"""
+    # The server reports isError results as "Error: ...", the client as
+    # "Error calling MCP tool: ..." or a timeout message
+    return result.startswith(("Error", "Timeout when calling MCP tool"))
+
+
+def _forget_tool_call(key):
+    """Drops cached tool call, e.g. after it failed"""
+    _TOOL_CALL_CACHE.pop(key, None)
+
+
+def _remember_tool_call(key, tool_name, tool_args):
+    """Stores tool call chosen by the model, evicting the oldest entry if full"""
+    _TOOL_CALL_CACHE[key] = (tool_name, copy.deepcopy(tool_args))
+    _TOOL_CALL_CACHE.move_to_end(key)
+    if len(_TOOL_CALL_CACHE) > _TOOL_CALL_CACHE_SIZE:
+        _TOOL_CALL_CACHE.popitem(last=False)
+
+
+def _ensure_search_query(tool_args, user_query):
+    """Fills in empty search query from the original request"""
+    if not isinstance(tool_args, dict):
+        tool_args = {}
+    if not tool_args.get("query"):
+        query = extract_search_query(user_query)
+        logger.debug("🔍 Extraction result: '%s'", query)
+        if query:
+            tool_args["query"] = query
+        else:
+            # extract_search_query already fell back to the whole
+            # request without service words, so nothing is left to try
+            logger.debug("⚠️ Failed to extract query from: '%s'", user_query)
+    return tool_args
+
+
+# Tool name -> function(arguments, user_query) repairing arguments from the model
+_ARGUMENT_FIXUPS = {
+    "search_google_in_safari": _ensure_search_query,
+}
+
+
+# String value of an {"answer": "..."} reply, up to its closing quote or the
+# point where generation stopped
+_PARTIAL_ANSWER = re.compile(r'^\s*\{\s*"answer"\s*:\s*"((?:[^"\\]|\\.)*)')
+
+
+def _partial_answer(answer):
+    """Returns text of an {"answer": ...} reply cut off by num_predict, or None"""
+    match = _PARTIAL_ANSWER.match(answer)
+    if not match:
+        return None
+    text = match.group(1)
+    # Only the end can be broken: a lone backslash or an unfinished \uXXXX
+    for end in range(len(text), max(len(text) - 6, 0) - 1, -1):
+        try:
+            return orjson.loads(f'"{text[:end]}"').strip() or None
+        except orjson.JSONDecodeError:
+            continue
+    return None
+
+
+def ask_ollama(user_query):
+    """
+    Uses Ollama to understand the request and call appropriate MCP tools.
+    
+    Returns:
+        tuple: (text, is_action) - tool result or model answer, and whether
+               an MCP tool was called
+    """
+    
+    # Common commands don't need the model at all
+    fast_call = route_fast_path(user_query)
+    if fast_call:
+        tool_name, tool_args = fast_call
+        logger.info("⚡ Fast path: %s", tool_name)
+        logger.info("📝 Arguments: %s", tool_args)
+        result = call_mcp_tool(tool_name, tool_args)
+        if not _is_error_result(result):
+            return result, True
+        # The route may have misread the request: let the model try it
+        logger.info("⚡ Fast path failed, asking the model: %s", result)
+    
+    # The same command was already understood by the model earlier
+    cache_key = _tool_call_key(user_query)
+    cached_call = _TOOL_CALL_CACHE.get(cache_key)
+    if cached_call:
+        _TOOL_CALL_CACHE.move_to_end(cache_key)
+        tool_name, tool_args = cached_call
+        logger.info("♻️ Cached: %s", tool_name)
+        logger.info("📝 Arguments: %s", tool_args)
+        result = call_mcp_tool(tool_name, copy.deepcopy(tool_args))
+        if _is_error_result(result):
+            # Ask the model again next time instead of replaying a failing call
+            _forget_tool_call(cache_key)
+        return result, True
+    
+    # Create system prompt with tool descriptions
+    system_prompt = get_system_prompt()
+
     # Query Ollama
     try:
-        response = requests.post(
+        # Stream the generation so a tool call can be dispatched as soon as its
+        # JSON object is complete, without waiting for the model to finish
+        answer_parts = []
+        tool_call = None
+        done_reason = None
+        scanner = _JsonObjectScanner()
+        with _SESSION.post(
             f"{OLLAMA_API_URL}/api/generate",
             json={
                 "model": OLLAMA_MODEL,
                 "prompt": f"{system_prompt}\n\nUser: {user_query}\nAssistant:",
-                "stream": False,
+                "stream": True,
+                # Keep the model loaded between queries
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+                # JSON mode: decoding is constrained to valid JSON
+                "format": "json",
                 "options": {
-                    "temperature": 0.3,
-                    "max_tokens": 500
+                    "temperature": 0.1,
+                    # A tool call is well under 100 tokens; the rest is room
+                    # for a small inserted document or a short answer
+                    "num_predict": 128
                 }
             },
-            timeout=30
-        )
-        
-        if response.status_code != 200:
-            return f"Ollama error: {response.status_code}"
+            stream=True,
+            # Connecting to a local Ollama is instant, so a stopped server is
+            # reported after 3 s; reading allows for the model to load
+            timeout=(3, 30)
+        ) as response:
+            if response.status_code != 200:
+                return f"Ollama error: {response.status_code}", False
+            
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = orjson.loads(line)
+                fragment = chunk.get("response", "")
+                answer_parts.append(fragment)
+                for json_str in scanner.feed(fragment):
+                    try:
+                        candidate = orjson.loads(json_str)
+                    except orjson.JSONDecodeError:
+                        continue
+                    if "tool" in candidate:
+                        tool_call = candidate
+                        break
+                # Leaving the block closes the connection, which also stops generation
+                if tool_call is not None:
+                    break
+                if chunk.get("done"):
+                    done_reason = chunk.get("done_reason")
+                    break
         
-        result = response.json()
-        answer = result.get("response", "").strip()
+        answer = "".join(answer_parts).strip()
         
-        print(f"🤖 Ollama response: {answer}")
+        logger.debug("🤖 Ollama response: %s", answer)
         
-        # Try to parse JSON response
-        try:
-            # Look for JSON in response (may be on multiple lines)
-            import re
-            # More precise JSON object search
-            json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-            json_matches = re.findall(json_pattern, answer, re.DOTALL)
-            print(f"🔍 JSON matches: {json_matches}")
-            for json_str in json_matches:
-                try:
-                    tool_call = json.loads(json_str)
-                    if "tool" in tool_call:
-                        tool_name = tool_call["tool"]
-                        tool_args = tool_call.get("arguments", {})
-                        
-                        print(f"🔧 tool_call: {tool_call}")
-                        print(f"🔧 tool_name: {tool_name}")
-                        # Fallback: if arguments are empty for search_google_in_safari, extract query from user_query
-                        if tool_name == "search_google_in_safari":
-                            print(f"🔍 ==========tool_name: {tool_name}")
-                            # Check if query is in arguments
-                            current_query = None
-                            if tool_args and isinstance(tool_args, dict):
-                                current_query = tool_args.get("query")
-                            
-                            print(f"🔍 Check: tool_args={tool_args}, current_query={current_query}")
-                            
-                            if not current_query:
-                                # Try to extract search query from original request
-                                print(f"🔍 Extracting query from: '{user_query}'")
-                                query = extract_search_query(user_query)
-                                print(f"🔍 Extraction result: '{query}'")
-                                
-                                if query:
-                                    # Make sure tool_args is a dictionary
-                                    if not tool_args or not isinstance(tool_args, dict):
-                                        tool_args = {}
-                                    tool_args["query"] = query
-                                    print(f"✅ Set query: '{query}'")
-                                else:
-                                    print(f"⚠️ Failed to extract query from: '{user_query}'")
-                                    # As last resort, use entire query, removing service words
-                                    fallback_query = user_query.replace("find", "").replace("search", "").replace("in google", "").replace("for", "").strip()
-                                    if fallback_query:
-                                        if not tool_args or not isinstance(tool_args, dict):
-                                            tool_args = {}
-                                        tool_args["query"] = fallback_query
-                                        print(f"✅ Used fallback query: '{fallback_query}'")
-                        
-                        print(f"🔧 Calling tool: {tool_name}")
-                        print(f"📝 Arguments: {tool_args}")
-                        
-                        # Call MCP tool
-                        result = call_mcp_tool(tool_name, tool_args)
-                        return result
-                except json.JSONDecodeError:
-                    continue
+        if tool_call is None:
+            # Request doesn't need a tool: the model answers {"answer": "..."}
+            try:
+                reply = orjson.loads(answer)
+            except orjson.JSONDecodeError:
+                reply = None
+            if isinstance(reply, dict) and "answer" in reply:
+                return str(reply["answer"]), False
+            if reply is None and done_reason == "length":
+                # num_predict stopped a long answer: speak its text, not raw JSON
+                partial = _partial_answer(answer)
+                if partial:
+                    return partial, False
             
-            # If JSON not found, try to parse entire response as JSON
-            tool_call = json.loads(answer)
-            if "tool" in tool_call:
-                tool_name = tool_call["tool"]
-                tool_args = tool_call.get("arguments", {})
-                
-                # Fallback: if arguments are empty for search_google_in_safari, extract query from user_query
-                if tool_name == "search_google_in_safari" and (not tool_args or not tool_args.get("query")):
-                    query = extract_search_query(user_query)
-                    if query:
-                        if not tool_args:
-                            tool_args = {}
-                        tool_args["query"] = query
-                        print(f"🔍 Extracted search query from text: '{query}'")
-                    else:
-                        print(f"⚠️ Failed to extract search query from: '{user_query}'")
-                
-                print(f"🔧 Calling tool: {tool_name}")
-                print(f"📝 Arguments: {tool_args}")
-                
-                result = call_mcp_tool(tool_name, tool_args)
-                return result
-                    
-        except (json.JSONDecodeError, KeyError):
-            print(f"🔧 Failed to parse JSON: {answer}")
+            logger.debug("🔧 Failed to parse JSON: %s", answer)
             # If not JSON, check if it's just a tool name
-            answer_lower = answer.lower().strip()
-            if "search_google" in answer_lower or answer_lower == "search_google_in_safari":
+            if "search_google" in answer.lower():
                 # Try to extract search query from original request
-                query = extract_search_query(user_query)
-                if query:
-                    print(f"🔧 Calling tool: search_google_in_safari")
-                    print(f"📝 Arguments: {{'query': '{query}'}}")
-                    result = call_mcp_tool("search_google_in_safari", {"query": query})
-                    return result
-            # If not JSON, return regular response
-            pass
+                tool_args = _ensure_search_query({}, user_query)
+                if tool_args:
+                    logger.info("🔧 Calling tool: search_google_in_safari")
+                    logger.info("📝 Arguments: %s", tool_args)
+                    result = call_mcp_tool("search_google_in_safari", tool_args)
+                    return result, True
+            # If not a tool call, return regular response
+            return answer, False
+        
+        tool_name = tool_call["tool"]
+        tool_args = tool_call.get("arguments", {})
         
-        return answer
+        logger.debug("🔧 tool_call: %s", tool_call)
+        fix_arguments = _ARGUMENT_FIXUPS.get(tool_name)
+        if fix_arguments:
+            tool_args = fix_arguments(tool_args, user_query)
+        
+        logger.info("🔧 Calling tool: %s", tool_name)
+        logger.info("📝 Arguments: %s", tool_args)
+        
+        # Call MCP tool
+        result = call_mcp_tool(tool_name, tool_args)
+        # Only calls that worked are replayed for the same command
+        if not _is_error_result(result):
+            _remember_tool_call(cache_key, tool_name, tool_args)
+        return result, True
         
     except requests.exceptions.ConnectionError:
-        return "❌ Failed to connect to Ollama. Start: ollama serve"
+        return "❌ Failed to connect to Ollama. Start: ollama serve", False
     except Exception as e:
-        return f"Error: {str(e)}"
+        return f"Error: {str(e)}", False
 
 
-def main():
-    if len(sys.argv) > 1:
-        query = " ".join(sys.argv[1:])
-    else:
-        query = input("Enter request: ")
-    
+def ask_ollama_with_tools(user_query):
+    """Uses Ollama to understand the request and call appropriate MCP tools"""
+    result, _ = ask_ollama(user_query)
+    return result
+
+
+def configure_logging(verbose=False):
+    """Sets up client log output; --verbose or MCP_DEBUG=1 also shows debug messages"""
+    logging.basicConfig(
+        level=logging.DEBUG if verbose or os.environ.get("MCP_DEBUG") else logging.INFO,
+        format="%(message)s"
+    )
+
+
+def run_query(query):
+    """Processes one request and prints the result"""
     print(f"\n💬 Request: {query}")
     print("-" * 50)
     
@@ -394,6 +860,34 @@ def main():
     print()
 
 
+def main():
+    args = sys.argv[1:]
+    verbose = bool(args) and args[0] in ("-v", "--verbose")
+    if verbose:
+        args = args[1:]
+    configure_logging(verbose)
+    prefetch_mcp_tools()
+    
+    if args:
+        run_query(" ".join(args))
+        return
+    
+    # A single query loads the model itself; warming up would only make a
+    # fast-path command wait for the load before exiting
+    warm_up_ollama()
+    
+    # Interactive mode: the server process, HTTP session and cached prompt
+    # are reused for every request until an empty line, "exit" or Ctrl+D
+    while True:
+        try:
+            query = input("Enter request: ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if not query or query.lower() in ["exit", "quit"]:
+            break
+        run_query(query)
+
+
 if __name__ == "__main__":
     main()
-
@@ -6,28 +6,68 @@ Uses JSON-RPC protocol via stdio
 """
 
 import asyncio
-import json
+import atexit
+import functools
 import os
+import selectors
+import shutil
 import subprocess
 import sys
-from typing import Any, Dict, List, Optional
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 from urllib.parse import quote_plus
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from pymongo import MongoClient
 
+try:
+    import uvloop
+except ImportError:
+    # uvloop is optional (not available on Windows); default asyncio loop is used
+    uvloop = None
+
+try:
+    import fastjsonschema
+except ImportError:
+    # fastjsonschema is optional; tool arguments are then passed unchecked
+    fastjsonschema = None
+
+try:
+    from OSAKit import OSALanguage, OSAScript
+except ImportError:
+    # PyObjC OSAKit is optional (macOS only); osascript processes are used instead
+    OSAScript = None
+
 
 # Константы
 OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://localhost:11434")
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+GOOGLE_SEARCH_URL = "https://www.google.com/search?q="
+# Number of worker threads that run tool calls concurrently
+TOOL_WORKERS = int(os.getenv("MCP_TOOL_WORKERS", "20"))
+# Maximum number of requests processed at the same time; reading stdin
+# pauses while this many are in flight
+MAX_IN_FLIGHT = int(os.getenv("MCP_MAX_IN_FLIGHT", "20"))
+# Number of prompts of one ollama_generate_batch call sent to Ollama at once
+OLLAMA_BATCH_WORKERS = int(os.getenv("OLLAMA_BATCH_WORKERS", "4"))
+# Upper bound for limit of mongodb_find_documents
+FIND_MAX_LIMIT = int(os.getenv("MCP_FIND_MAX_LIMIT", "1000"))
+# Maximum size of one JSON-RPC line read from stdin
+STDIN_LINE_LIMIT = 16 * 1024 * 1024
+# Bytes -> GB factor for model sizes
+_GIB = 1.0 / (1024 * 1024 * 1024)
 
 
-def exec_command(command: str) -> tuple[str, str]:
-    """Executes shell command and returns stdout and stderr"""
+def exec_command(argv: List[str]) -> tuple[str, str]:
+    """Executes command (without a shell) and returns stdout and stderr"""
     try:
         result = subprocess.run(
-            command,
-            shell=True,
+            argv,
             capture_output=True,
             text=True,
             timeout=30
@@ -39,8 +79,223 @@ def exec_command(command: str) -> tuple[str, str]:
         return "", str(e)
 
 
-def get_tools() -> List[Dict[str, Any]]:
-    """Returns list of all available tools"""
+# Persistent AppleScript interpreter (osascript -i). Scripts are sent to its
+# stdin one line at a time, so there is no shell + osascript launch per call.
+_osa_proc: Optional[subprocess.Popen] = None
+_osa_lock = threading.Lock()
+_osa_disabled = False
+_osa_counter = 0
+
+
+def _applescript_string(text: str) -> str:
+    """Returns text as AppleScript string literal"""
+    escaped = (
+        text.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+        .replace("\t", "\\t")
+    )
+    return f'"{escaped}"'
+
+
+def _osa_read_until(proc: subprocess.Popen, marker: str, timeout: float) -> Optional[List[str]]:
+    """Reads osascript output lines up to marker; None on timeout or exit"""
+    # Raw reads: a buffered readline() could pull the marker line into its
+    # buffer, and select() would then wait for data that has already arrived
+    fd = proc.stdout.fileno()
+    output = b""
+    with selectors.DefaultSelector() as selector:
+        selector.register(fd, selectors.EVENT_READ)
+        deadline = time.monotonic() + timeout
+        while marker.encode() not in output:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not selector.select(remaining):
+                return None
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return None
+            output += chunk
+    lines = output.decode("utf-8", errors="replace").splitlines()
+    return [line for line in lines if marker not in line]
+
+
+def _osa_start() -> Optional[subprocess.Popen]:
+    """Starts osascript -i and checks that it answers; None if unusable"""
+    global _osa_disabled
+    try:
+        proc = subprocess.Popen(
+            ["osascript", "-i"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            # Errors are printed in order with results
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        marker = "__mcp_osa_ready__"
+        proc.stdin.write(f'"{marker}"\n')
+        proc.stdin.flush()
+        if _osa_read_until(proc, marker, timeout=5) is not None:
+            atexit.register(proc.kill)
+            return proc
+        proc.kill()
+    except OSError:
+        pass
+    # Interactive mode isn't usable here: use one osascript run per script
+    _osa_disabled = True
+    return None
+
+
+def _osa_parse(lines: List[str]) -> tuple[str, str]:
+    """Splits osascript -i output into result text and error text"""
+    result_lines = []
+    error_lines = []
+    target = result_lines
+    for line in lines:
+        # Drop prompts that end up in front of the output
+        while line.startswith(">> "):
+            line = line[3:]
+        if line.startswith("=> "):
+            target = result_lines
+            line = line[3:]
+        elif line.startswith("!! "):
+            target = error_lines
+            line = line[3:]
+        target.append(line)
+    return "\n".join(result_lines).strip(), "\n".join(error_lines).strip()
+
+
+# OSAKit (in-process AppleScript). Calls are serialized: OSA components aren't
+# thread-safe. A script can't be interrupted, so after a timeout it is left
+# running in its thread and osascript processes are used from then on.
+_osakit_lock = threading.Lock()
+_osakit_hung = False
+_TYPE_UNICODE_TEXT = 0x75747874  # 'utxt'
+
+
+def _osakit_compile(script: str) -> Any:
+    """Compiles AppleScript in-process; raises ValueError on syntax error"""
+    language = OSALanguage.languageForName_("AppleScript")
+    compiled = OSAScript.alloc().initWithSource_language_(script, language)
+    ok, error = compiled.compileAndReturnError_(None)
+    if not ok:
+        raise ValueError(_osakit_error(error))
+    return compiled
+
+
+@functools.lru_cache(maxsize=None)
+def _osakit_template(name: str, script: str) -> Any:
+    """Compiles constant AppleScript once (user scripts are compiled fresh,
+    since properties and globals of a compiled script persist between runs)"""
+    return _osakit_compile(script)
+
+
+def _osakit_error(error: Any) -> str:
+    """Returns message of OSAKit error dictionary"""
+    if not error:
+        return "Unknown AppleScript error"
+    return str(error.get("OSAScriptErrorMessageKey") or error)
+
+
+def _osakit_execute(script: str, name: Optional[str]) -> tuple[str, str]:
+    """Compiles and executes AppleScript via OSAKit, returns stdout and stderr"""
+    try:
+        compiled = _osakit_template(name, script) if name else _osakit_compile(script)
+    except ValueError as e:
+        return "", str(e)
+    result, error = compiled.executeAndReturnError_(None)
+    if result is None:
+        return "", _osakit_error(error)
+    # stringValue is empty for lists and records, so coerce them to text first
+    text = result.coerceToDescriptorType_(_TYPE_UNICODE_TEXT) or result
+    return text.stringValue() or "", ""
+
+
+def _osakit_run(script: str, timeout: float, name: Optional[str] = None) -> Optional[tuple[str, str]]:
+    """Executes AppleScript via OSAKit within timeout; None if OSAKit is unusable"""
+    global _osakit_hung
+    with _osakit_lock:
+        if _osakit_hung:
+            return None
+        output: List[tuple[str, str]] = []
+        worker = threading.Thread(
+            target=lambda: output.append(_osakit_execute(script, name)), daemon=True
+        )
+        worker.start()
+        worker.join(timeout)
+        if worker.is_alive():
+            _osakit_hung = True
+            return "", "Command execution timeout"
+        return output[0] if output else ("", "AppleScript execution failed")
+
+
+def run_osascript(script: str, timeout: float = 30) -> tuple[str, str]:
+    """Executes AppleScript and returns stdout and stderr"""
+    global _osa_proc, _osa_counter
+    if OSAScript is not None:
+        # In-process: no osascript at all
+        output = _osakit_run(script, timeout)
+        if output is not None:
+            return output
+
+    with _osa_lock:
+        if _osa_proc is None or _osa_proc.poll() is not None:
+            _osa_proc = None if _osa_disabled else _osa_start()
+        if _osa_proc is None:
+            return exec_command(["osascript", "-e", script])
+
+        _osa_counter += 1
+        marker = f"__mcp_osa_end_{_osa_counter}__"
+        try:
+            # One line per script: run script compiles and runs the source,
+            # the marker string that follows shows where its output ends
+            _osa_proc.stdin.write(f"run script {_applescript_string(script)}\n")
+            _osa_proc.stdin.write(f'"{marker}"\n')
+            _osa_proc.stdin.flush()
+        except OSError as e:
+            _osa_proc = None
+            return "", str(e)
+
+        lines = _osa_read_until(_osa_proc, marker, timeout)
+        if lines is None:
+            # Output of the interpreter is out of sync now; start a new one next time
+            _osa_proc.kill()
+            _osa_proc = None
+            return "", "Command execution timeout"
+        return _osa_parse(lines)
+
+
+@functools.lru_cache(maxsize=1)
+def _script_dir() -> str:
+    """Returns directory for compiled scripts, removed on exit"""
+    path = tempfile.mkdtemp(prefix="mcp_osa_")
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_script(name: str, script: str) -> Optional[str]:
+    """Compiles constant AppleScript to .scpt once; None if osacompile failed"""
+    path = os.path.join(_script_dir(), f"{name}.scpt")
+    exec_command(["osacompile", "-o", path, "-e", script])
+    return path if os.path.isfile(path) else None
+
+
+def run_osascript_template(name: str, script: str, timeout: float = 30) -> tuple[str, str]:
+    """Executes constant AppleScript, compiling it only on first use"""
+    if OSAScript is not None:
+        output = _osakit_run(script, timeout, name)
+        if output is not None:
+            return output
+    # osascript would parse the source on every call; a .scpt is loaded as is
+    path = _compiled_script(name, script)
+    if path is not None:
+        script = f"run script (POSIX file {_applescript_string(path)})"
+    return run_osascript(script, timeout)
+
+
+def _build_tools() -> List[Dict[str, Any]]:
+    """Builds list of all available tools"""
     return [
         {
             "name": "open_application",
@@ -133,6 +388,26 @@ def get_tools() -> List[Dict[str, Any]]:
                 "required": ["prompt"],
             },
         },
+        {
+            "name": "ollama_generate_batch",
+            "description": "Generates responses for several prompts at once using local Ollama model. Faster than calling ollama_generate for each prompt",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "model": {
+                        "type": "string",
+                        "description": "Ollama model name (e.g., 'llama3.2', 'deepseek-r1:8b'). Default 'llama3.2'",
+                        "default": "llama3.2",
+                    },
+                    "prompts": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "List of prompts for the model",
+                    },
+                },
+                "required": ["prompts"],
+            },
+        },
         {
             "name": "ollama_list_models",
             "description": "Gets list of available Ollama models",
@@ -143,7 +418,7 @@ def get_tools() -> List[Dict[str, Any]]:
         },
         {
             "name": "mongodb_create_database",
-            "description": "Creates new database in MongoDB",
+            "description": "Prepares new database in MongoDB (it is created on first insert or collection)",
             "inputSchema": {
                 "type": "object",
                 "properties": {
@@ -215,7 +490,7 @@ def get_tools() -> List[Dict[str, Any]]:
         },
         {
             "name": "mongodb_insert_document",
-            "description": "Inserts document into collection",
+            "description": "Inserts document (or array of documents) into collection",
             "inputSchema": {
                 "type": "object",
                 "properties": {
@@ -228,8 +503,8 @@ def get_tools() -> List[Dict[str, Any]]:
                         "description": "Collection name",
                     },
                     "document": {
-                        "type": "string",
-                        "description": "JSON string with document to insert",
+                        "type": ["object", "array", "string"],
+                        "description": "Document to insert (object), array of documents, or the same as a JSON string",
                     },
                 },
                 "required": ["databaseName", "collectionName", "document"],
@@ -255,7 +530,11 @@ def get_tools() -> List[Dict[str, Any]]:
                     },
                     "limit": {
                         "type": "number",
-                        "description": "Maximum number of documents (default 100)",
+                        "description": f"Maximum number of documents (default 100, at most {FIND_MAX_LIMIT})",
+                    },
+                    "projection": {
+                        "type": "string",
+                        "description": 'JSON string with fields to return, e.g. {"name": 1, "_id": 0} (optional, default all fields)',
                     },
                 },
                 "required": ["databaseName", "collectionName"],
@@ -300,15 +579,41 @@ def get_tools() -> List[Dict[str, Any]]:
     ]
 
 
+# Tool schemas are constant: build them once, and serialize the tools/list
+# result once so responses can reuse the encoded JSON
+_TOOLS = _build_tools()
+_TOOLS_RESULT = {"tools": _TOOLS}
+_TOOLS_RESULT_JSON = orjson.dumps(_TOOLS_RESULT)
+
+
+# Tool name -> validator of its arguments, generated from inputSchema once
+_VALIDATORS: Dict[str, Callable[[Any], Any]] = (
+    {tool["name"]: fastjsonschema.compile(tool["inputSchema"]) for tool in _TOOLS}
+    if fastjsonschema is not None
+    else {}
+)
+
+
+def get_tools() -> List[Dict[str, Any]]:
+    """Returns list of all available tools"""
+    return _TOOLS
+
+
 # Implementation of tools for working with Mac applications
 def open_application(app_name: str) -> str:
     """Opens application by name"""
-    stdout, stderr = exec_command(f'open -a "{app_name}"')
+    stdout, stderr = exec_command(["open", "-a", app_name])
     if stderr:
         raise Exception(f'Failed to launch application "{app_name}": {stderr}')
     return f'Application "{app_name}" successfully launched'
 
 
+@functools.lru_cache(maxsize=512)
+def _encode_query(query: str) -> str:
+    """URL-encodes search query (cached for repeated queries)"""
+    return quote_plus(query)
+
+
 def search_google_in_safari(query: str) -> str:
     """Performs Google search through Safari"""
     if not query:
@@ -316,10 +621,9 @@ def search_google_in_safari(query: str) -> str:
     
     # Convert to string and encode search query for URL
     query_str = str(query)
-    encoded_query = quote_plus(query_str)
-    google_url = f"https://www.google.com/search?q={encoded_query}"
+    google_url = GOOGLE_SEARCH_URL + _encode_query(query_str)
     
-    stdout, stderr = exec_command(f'open -a Safari "{google_url}"')
+    stdout, stderr = exec_command(["open", "-a", "Safari", google_url])
     if stderr:
         raise Exception(f'Failed to open search in Safari: {stderr}')
     return f'Search "{query_str}" opened in Safari'
@@ -327,29 +631,31 @@ def search_google_in_safari(query: str) -> str:
 
 def get_running_applications() -> str:
     """Gets list of running applications"""
-    apple_script = 'tell application "System Events" to get name of every application process whose background only is false'
-    stdout, stderr = exec_command(f'osascript -e \'{apple_script}\'')
+    # Names are joined with NUL: unlike ", " it can't occur inside an app name
+    apple_script = (
+        "set AppleScript's text item delimiters to (ASCII character 0)\n"
+        'tell application "System Events" to get (name of every application process '
+        "whose background only is false) as text"
+    )
+    stdout, stderr = run_osascript_template("running_applications", apple_script)
     if stderr:
         raise Exception(f"Failed to get list of applications: {stderr}")
 
-    apps = [app.strip() for app in stdout.strip().split(", ") if app.strip()]
+    apps = [app for app in stdout.strip("\0\n").split("\0") if app]
     return "Running applications:\n" + "\n".join(apps)
 
 
 def run_applescript(app_name: str, script: str) -> str:
     """Executes AppleScript command"""
     apple_script = f'tell application "{app_name}"\n{script}\nend tell'
-    # Escape single quotes
-    apple_script_escaped = apple_script.replace("'", "'\\''")
-    stdout, stderr = exec_command(f"osascript -e '{apple_script_escaped}'")
+    stdout, stderr = run_osascript(apple_script)
     return stdout or stderr or "Command executed successfully"
 
 
 def quit_application(app_name: str) -> str:
     """Closes application"""
     apple_script = f'tell application "{app_name}"\nquit\nend tell'
-    apple_script_escaped = apple_script.replace("'", "'\\''")
-    stdout, stderr = exec_command(f"osascript -e '{apple_script_escaped}'")
+    stdout, stderr = run_osascript(apple_script)
     if stderr:
         raise Exception(f'Failed to close application "{app_name}": {stderr}')
     return f'Application "{app_name}" closed'
@@ -357,24 +663,49 @@ def quit_application(app_name: str) -> str:
 
 def open_file_with_app(path: str, app_name: str) -> str:
     """Opens file in specified application"""
-    stdout, stderr = exec_command(f'open -a "{app_name}" "{path}"')
+    stdout, stderr = exec_command(["open", "-a", app_name, path])
     if stderr:
         raise Exception(f"Failed to open file: {stderr}")
     return f'File "{path}" opened in application "{app_name}"'
 
 
 # Implementation of tools for working with Ollama
+# Shared HTTP session: keep-alive connections to Ollama are reused between calls
+_ollama_session = requests.Session()
+# One keep-alive connection per tool worker, so concurrent calls don't
+# open and discard extra sockets when the pool is exhausted
+_ollama_adapter = HTTPAdapter(
+    pool_connections=10, pool_maxsize=TOOL_WORKERS, max_retries=0
+)
+_ollama_session.mount("http://", _ollama_adapter)
+_ollama_session.mount("https://", _ollama_adapter)
+# Workers for ollama_generate_batch
+_ollama_batch_pool = ThreadPoolExecutor(max_workers=OLLAMA_BATCH_WORKERS)
+
+
 def ollama_generate(prompt: str, model: str = "llama3.2") -> str:
     """Generates response via Ollama API"""
     try:
-        response = requests.post(
+        # Streamed: the timeout applies to each chunk instead of the whole
+        # completion, and tokens are decoded as they arrive
+        with _ollama_session.post(
             f"{OLLAMA_API_URL}/api/generate",
-            json={"model": model, "prompt": prompt, "stream": False},
+            json={"model": model, "prompt": prompt, "stream": True},
             timeout=30,
-        )
-        response.raise_for_status()
-        data = response.json()
-        return data.get("response", "No response from model")
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            chunks = []
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = orjson.loads(line)
+                if "error" in data:
+                    raise Exception(data["error"])
+                chunks.append(data.get("response", ""))
+                if data.get("done"):
+                    break
+        return "".join(chunks) or "No response from model"
     except requests.exceptions.ConnectionError:
         raise Exception(
             f"Failed to connect to Ollama server ({OLLAMA_API_URL}). "
@@ -384,10 +715,29 @@ def ollama_generate(prompt: str, model: str = "llama3.2") -> str:
         raise Exception(f"Ollama error: {str(e)}")
 
 
+def ollama_generate_batch(prompts: List[str], model: str = "llama3.2") -> str:
+    """Generates responses for several prompts concurrently via Ollama API"""
+    if not prompts:
+        raise Exception("Prompt list cannot be empty")
+
+    def generate(prompt: str) -> str:
+        try:
+            return ollama_generate(prompt, model)
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    # Requests share keep-alive connections of the session; Ollama handles
+    # them in parallel up to its OLLAMA_NUM_PARALLEL setting
+    responses = list(_ollama_batch_pool.map(generate, prompts))
+    return "\n\n".join(
+        f"[{index}] {response}" for index, response in enumerate(responses, 1)
+    )
+
+
 def ollama_list_models() -> str:
     """Gets list of Ollama models"""
     try:
-        response = requests.get(f"{OLLAMA_API_URL}/api/tags", timeout=10)
+        response = _ollama_session.get(f"{OLLAMA_API_URL}/api/tags", timeout=10)
         response.raise_for_status()
         data = response.json()
         models = data.get("models", [])
@@ -396,10 +746,8 @@ def ollama_list_models() -> str:
             return "No available models. Load a model: ollama pull llama3.2"
 
         model_list = "\n".join(
-            [
-                f"- {model['name']} ({(model.get('size', 0) / 1024 / 1024 / 1024):.2f} GB)"
-                for model in models
-            ]
+            f"- {model['name']} ({model.get('size', 0) * _GIB:.2f} GB)"
+            for model in models
         )
         return f"Available Ollama models:\n{model_list}"
     except requests.exceptions.ConnectionError:
@@ -412,24 +760,45 @@ def ollama_list_models() -> str:
 
 
 # Implementation of tools for working with MongoDB
+_mongo_client: Optional[MongoClient] = None
+_mongo_client_lock = threading.Lock()
+
+
+def get_mongo_client() -> MongoClient:
+    """Returns shared MongoClient; its connection pool is reused by all calls"""
+    global _mongo_client
+    if _mongo_client is None:
+        with _mongo_client_lock:
+            if _mongo_client is None:
+                # Idle sockets above minPoolSize are closed after a minute
+                _mongo_client = MongoClient(
+                    MONGODB_URI,
+                    maxPoolSize=20,
+                    minPoolSize=2,
+                    maxIdleTimeMS=60000,
+                )
+                atexit.register(_mongo_client.close)
+    return _mongo_client
+
+
 def mongodb_create_database(database_name: str) -> str:
     """Creates database in MongoDB"""
-    client = MongoClient(MONGODB_URI)
+    client = get_mongo_client()
     try:
-        db = client[database_name]
-        # Create temporary collection so database is actually created
-        db.create_collection("_temp")
-        db["_temp"].drop()
-        return f'Database "{database_name}" successfully created'
+        # MongoDB creates databases lazily on first write, so there is nothing
+        # to create up front; ping checks the name and that the server answers
+        client[database_name].command("ping")
+        return (
+            f'Database "{database_name}" is ready; MongoDB creates it '
+            f"when the first collection or document is added"
+        )
     except Exception as e:
         raise Exception(f"Error creating database: {str(e)}")
-    finally:
-        client.close()
 
 
 def mongodb_list_databases() -> str:
     """Gets list of databases"""
-    client = MongoClient(MONGODB_URI)
+    client = get_mongo_client()
     try:
         admin_db = client.admin
         databases = admin_db.command("listDatabases")
@@ -444,13 +813,11 @@ def mongodb_list_databases() -> str:
         return result
     except Exception as e:
         raise Exception(f"Error getting list of databases: {str(e)}")
-    finally:
-        client.close()
 
 
 def mongodb_create_collection(database_name: str, collection_name: str) -> str:
     """Creates collection in database"""
-    client = MongoClient(MONGODB_URI)
+    client = get_mongo_client()
     try:
         db = client[database_name]
         db.create_collection(collection_name)
@@ -460,13 +827,11 @@ def mongodb_create_collection(database_name: str, collection_name: str) -> str:
         )
     except Exception as e:
         raise Exception(f"Error creating collection: {str(e)}")
-    finally:
-        client.close()
 
 
 def mongodb_list_collections(database_name: str) -> str:
     """Gets list of collections"""
-    client = MongoClient(MONGODB_URI)
+    client = get_mongo_client()
     try:
         db = client[database_name]
         collections = list(db.list_collection_names())
@@ -476,13 +841,11 @@ def mongodb_list_collections(database_name: str) -> str:
         return result
     except Exception as e:
         raise Exception(f"Error getting list of collections: {str(e)}")
-    finally:
-        client.close()
 
 
 def mongodb_delete_collection(database_name: str, collection_name: str) -> str:
     """Deletes collection"""
-    client = MongoClient(MONGODB_URI)
+    client = get_mongo_client()
     try:
         db = client[database_name]
         db[collection_name].drop()
@@ -492,25 +855,44 @@ def mongodb_delete_collection(database_name: str, collection_name: str) -> str:
         )
     except Exception as e:
         raise Exception(f"Error deleting collection: {str(e)}")
-    finally:
-        client.close()
 
 
 def mongodb_insert_document(
-    database_name: str, collection_name: str, document_json: str
+    database_name: str, collection_name: str, document_json: Any
 ) -> str:
     """Inserts document into collection"""
-    client = MongoClient(MONGODB_URI)
+    client = get_mongo_client()
     try:
         db = client[database_name]
         collection = db[collection_name]
-        document = json.loads(document_json)
+        # Documents sent as JSON objects arrive already parsed
+        document = (
+            orjson.loads(document_json)
+            if isinstance(document_json, str)
+            else document_json
+        )
+        if isinstance(document, list):
+            # One round trip for the whole array; unordered lets the server
+            # continue past a failed document
+            result = collection.insert_many(document, ordered=False)
+            return (
+                f'Documents successfully inserted into collection "{collection_name}": '
+                f"{len(result.inserted_ids)}"
+            )
         result = collection.insert_one(document)
         return f'Document successfully inserted into collection "{collection_name}". ID: {result.inserted_id}'
     except Exception as e:
         raise Exception(f"Error inserting document: {str(e)}")
-    finally:
-        client.close()
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_filter(filter_json: str) -> Dict[str, Any]:
+    """Parses filter (or projection) JSON, reusing the result for repeated strings
+
+    The returned dict is shared between calls and must not be modified.
+    PyMongo only reads filters and projections, so it is passed as is.
+    """
+    return orjson.loads(filter_json)
 
 
 def mongodb_find_documents(
@@ -518,41 +900,157 @@ def mongodb_find_documents(
     collection_name: str,
     filter_json: Optional[str] = None,
     limit: int = 100,
+    projection_json: Optional[str] = None,
 ) -> str:
     """Finds documents in collection"""
-    client = MongoClient(MONGODB_URI)
+    client = get_mongo_client()
     try:
         db = client[database_name]
         collection = db[collection_name]
-        filter_dict = json.loads(filter_json) if filter_json else {}
-        documents = list(collection.find(filter_dict).limit(limit))
-        # Convert ObjectId to strings
-        for doc in documents:
-            if "_id" in doc:
-                doc["_id"] = str(doc["_id"])
-        documents_str = json.dumps(documents, ensure_ascii=False, indent=2)
-        return f"Found documents: {len(documents)}\n\n{documents_str}"
+        filter_dict = _parse_filter(filter_json) if filter_json else {}
+        # Only requested fields are sent by MongoDB, decoded and serialized
+        projection = _parse_filter(projection_json) if projection_json else None
+        # limit(0) would mean "no limit" to MongoDB, so it is clamped to 1
+        limit = min(max(1, int(limit)), FIND_MAX_LIMIT)
+        # Explicit batch size: up to 200 documents come back in the first reply
+        # instead of the server's default first batch of 101
+        cursor = collection.find(filter_dict, projection).batch_size(min(limit, 200)).limit(limit)
+        # Documents are serialized as the cursor yields them, so decoded
+        # documents don't pile up in a list next to their JSON
+        parts = []
+        for document in cursor:
+            # default=str turns ObjectId (and other BSON types) into strings
+            encoded = orjson.dumps(
+                document,
+                default=str,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+            )
+            # Indent one level, as inside the array (JSON strings hold no raw newlines)
+            parts.append(b"  " + encoded.replace(b"\n", b"\n  "))
+        documents_str = (
+            (b"[\n" + b",\n".join(parts) + b"\n]") if parts else b"[]"
+        ).decode()
+        return f"Found documents: {len(parts)}\n\n{documents_str}"
     except Exception as e:
         raise Exception(f"Error finding documents: {str(e)}")
-    finally:
-        client.close()
 
 
 def mongodb_delete_document(
     database_name: str, collection_name: str, filter_json: str
 ) -> str:
     """Deletes document(s) by filter"""
-    client = MongoClient(MONGODB_URI)
+    client = get_mongo_client()
     try:
         db = client[database_name]
         collection = db[collection_name]
-        filter_dict = json.loads(filter_json)
+        filter_dict = _parse_filter(filter_json)
         result = collection.delete_many(filter_dict)
         return f"Deleted documents: {result.deleted_count}"
     except Exception as e:
         raise Exception(f"Error deleting document: {str(e)}")
-    finally:
-        client.close()
+
+
+# Tool name -> function(arguments) that calls the tool implementation
+TOOL_HANDLERS: Dict[str, Callable[[Dict[str, Any]], str]] = {
+    "open_application": lambda arguments: open_application(
+        arguments.get("appName")
+    ),
+    "get_running_applications": lambda arguments: get_running_applications(),
+    "run_applescript": lambda arguments: run_applescript(
+        arguments.get("appName"), arguments.get("script")
+    ),
+    "quit_application": lambda arguments: quit_application(
+        arguments.get("appName")
+    ),
+    "open_file_with_app": lambda arguments: open_file_with_app(
+        arguments.get("path"), arguments.get("appName")
+    ),
+    "search_google_in_safari": lambda arguments: search_google_in_safari(
+        arguments.get("query")
+    ),
+    "ollama_generate": lambda arguments: ollama_generate(
+        arguments.get("prompt"), arguments.get("model", "llama3.2")
+    ),
+    "ollama_generate_batch": lambda arguments: ollama_generate_batch(
+        arguments.get("prompts"), arguments.get("model", "llama3.2")
+    ),
+    "ollama_list_models": lambda arguments: ollama_list_models(),
+    # "mongodb_create_database": lambda arguments: mongodb_create_database(
+    #     arguments.get("databaseName")
+    # ),
+    # "mongodb_list_databases": lambda arguments: mongodb_list_databases(),
+    # "mongodb_create_collection": lambda arguments: mongodb_create_collection(
+    #     arguments.get("databaseName"), arguments.get("collectionName")
+    # ),
+    # "mongodb_list_collections": lambda arguments: mongodb_list_collections(
+    #     arguments.get("databaseName")
+    # ),
+    # "mongodb_delete_collection": lambda arguments: mongodb_delete_collection(
+    #     arguments.get("databaseName"), arguments.get("collectionName")
+    # ),
+    # "mongodb_insert_document": lambda arguments: mongodb_insert_document(
+    #     arguments.get("databaseName"),
+    #     arguments.get("collectionName"),
+    #     arguments.get("document"),
+    # ),
+    # "mongodb_find_documents": lambda arguments: mongodb_find_documents(
+    #     arguments.get("databaseName"),
+    #     arguments.get("collectionName"),
+    #     arguments.get("filter"),
+    #     arguments.get("limit", 100),
+    #     arguments.get("projection"),
+    # ),
+    # "mongodb_delete_document": lambda arguments: mongodb_delete_document(
+    #     arguments.get("databaseName"),
+    #     arguments.get("collectionName"),
+    #     arguments.get("filter"),
+    # ),
+}
+
+
+_INITIALIZE_RESULT = {
+    "protocolVersion": "2024-11-05",
+    "capabilities": {
+        "tools": {},
+    },
+    "serverInfo": {
+        "name": "mac-apps-mcp-server",
+        "version": "1.0.0",
+    },
+}
+
+
+def _call_tool(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Calls tool named in tools/call params and returns its result"""
+    tool_name = params.get("name")
+    # Clients may send "arguments": null for tools without arguments
+    arguments = params.get("arguments") or {}
+
+    # Call corresponding tool
+    handler = TOOL_HANDLERS.get(tool_name)
+    if handler is None:
+        raise ValueError(f"Unknown tool: {tool_name}")
+    validate = _VALIDATORS.get(tool_name)
+    if validate is not None:
+        try:
+            validate(arguments)
+        except fastjsonschema.JsonSchemaException as e:
+            raise ValueError(f"Invalid arguments for {tool_name}: {e.message}")
+    result_text = handler(arguments)
+
+    return {
+        "content": [
+            {"type": "text", "text": result_text}
+        ],
+    }
+
+
+# JSON-RPC method -> function(params) that returns the result
+METHOD_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "initialize": lambda params: _INITIALIZE_RESULT,
+    "tools/list": lambda params: _TOOLS_RESULT,
+    "tools/call": _call_tool,
+}
 
 
 def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
@@ -561,114 +1059,23 @@ def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
     params = request.get("params", {})
     request_id = request.get("id")
 
-    try:
-        if method == "initialize":
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "protocolVersion": "2024-11-05",
-                    "capabilities": {
-                        "tools": {},
-                    },
-                    "serverInfo": {
-                        "name": "mac-apps-mcp-server",
-                        "version": "1.0.0",
-                    },
-                },
-            }
-
-        elif method == "tools/list":
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "tools": get_tools(),
-                },
-            }
-
-        elif method == "tools/call":
-            tool_name = params.get("name")
-            arguments = params.get("arguments", {})
-
-            # Call corresponding tool
-            if tool_name == "open_application":
-                result_text = open_application(arguments.get("appName"))
-            elif tool_name == "get_running_applications":
-                result_text = get_running_applications()
-            elif tool_name == "run_applescript":
-                result_text = run_applescript(
-                    arguments.get("appName"), arguments.get("script")
-                )
-            elif tool_name == "quit_application":
-                result_text = quit_application(arguments.get("appName"))
-            elif tool_name == "open_file_with_app":
-                result_text = open_file_with_app(
-                    arguments.get("path"), arguments.get("appName")
-                )
-            elif tool_name == "search_google_in_safari":
-                result_text = search_google_in_safari(arguments.get("query"))
-            elif tool_name == "ollama_generate":
-                result_text = ollama_generate(
-                    arguments.get("prompt"), arguments.get("model", "llama3.2")
-                )
-            elif tool_name == "ollama_list_models":
-                result_text = ollama_list_models()
-            # elif tool_name == "mongodb_create_database":
-            #     result_text = mongodb_create_database(arguments.get("databaseName"))
-            # elif tool_name == "mongodb_list_databases":
-            #     result_text = mongodb_list_databases()
-            # elif tool_name == "mongodb_create_collection":
-            #     result_text = mongodb_create_collection(
-            #         arguments.get("databaseName"), arguments.get("collectionName")
-            #     )
-            # elif tool_name == "mongodb_list_collections":
-            #     result_text = mongodb_list_collections(arguments.get("databaseName"))
-            # elif tool_name == "mongodb_delete_collection":
-            #     result_text = mongodb_delete_collection(
-            #         arguments.get("databaseName"), arguments.get("collectionName")
-            #     )
-            # elif tool_name == "mongodb_insert_document":
-            #     result_text = mongodb_insert_document(
-            #         arguments.get("databaseName"),
-            #         arguments.get("collectionName"),
-            #         arguments.get("document"),
-            #     )
-            # elif tool_name == "mongodb_find_documents":
-            #     result_text = mongodb_find_documents(
-            #         arguments.get("databaseName"),
-            #         arguments.get("collectionName"),
-            #         arguments.get("filter"),
-            #         arguments.get("limit", 100),
-            #     )
-            # elif tool_name == "mongodb_delete_document":
-            #     result_text = mongodb_delete_document(
-            #         arguments.get("databaseName"),
-            #         arguments.get("collectionName"),
-            #         arguments.get("filter"),
-            #     )
-            else:
-                raise ValueError(f"Unknown tool: {tool_name}")
-
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "content": [
-                        {"type": "text", "text": result_text}
-                    ],
-                },
-            }
+    handler = METHOD_HANDLERS.get(method)
+    if handler is None:
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {
+                "code": -32601,
+                "message": f"Method not found: {method}",
+            },
+        }
 
-        else:
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "error": {
-                    "code": -32601,
-                    "message": f"Method not found: {method}",
-                },
-            }
+    try:
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "result": handler(params),
+        }
 
     except Exception as e:
         error_msg = str(e)
@@ -683,39 +1090,180 @@ def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
-def main():
-    """Main function - processes JSON-RPC requests via stdio"""
-    print("MCP Mac Apps Server (Python) started", file=sys.stderr)
+def dump_response(response: Any) -> bytes:
+    """Serializes response (or batch of responses) to JSON"""
+    if isinstance(response, list):
+        return b"[" + b",".join(dump_response(item) for item in response) + b"]"
+    if response.get("result") is _TOOLS_RESULT:
+        # Splice pre-serialized tool list instead of encoding it again
+        return (
+            b'{"jsonrpc":"2.0","id":' + orjson.dumps(response["id"])
+            + b',"result":' + _TOOLS_RESULT_JSON + b"}"
+        )
+    return orjson.dumps(response)
+
+
+# Workers for items of one JSON-RPC batch. Separate from the executor that
+# runs process_line, so a batch never waits on threads it occupies itself
+_batch_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS)
+
+
+def dump_line(response: Any) -> bytes:
+    """Serializes response as one newline-terminated output line"""
+    if isinstance(response, dict) and response.get("result") is not _TOOLS_RESULT:
+        # orjson writes the newline into the same buffer: no extra copy
+        return orjson.dumps(response, option=orjson.OPT_APPEND_NEWLINE)
+    return dump_response(response) + b"\n"
+
+
+def process_line(line: bytes) -> bytes:
+    """Handles one stdin line (request or batch) and returns response line"""
+    try:
+        request = orjson.loads(line)
+        if isinstance(request, list):
+            # JSON-RPC batch: answer with one array for the whole batch
+            if not request:
+                response = {
+                    "jsonrpc": "2.0",
+                    "id": None,
+                    "error": {
+                        "code": -32600,
+                        "message": "Invalid Request: empty batch",
+                    },
+                }
+            elif len(request) == 1:
+                response = [handle_request(request[0])]
+            else:
+                # Items are independent: their tool calls wait on I/O together.
+                # map() keeps responses in request order
+                response = list(_batch_pool.map(handle_request, request))
+        else:
+            response = handle_request(request)
+        return dump_line(response)
+    except orjson.JSONDecodeError as e:
+        error_response = {
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {
+                "code": -32700,
+                "message": f"Parse error: {str(e)}",
+            },
+        }
+        return orjson.dumps(error_response, option=orjson.OPT_APPEND_NEWLINE)
+    except Exception as e:
+        error_response = {
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {
+                "code": -32603,
+                "message": f"Internal error: {str(e)}",
+            },
+        }
+        return orjson.dumps(error_response, option=orjson.OPT_APPEND_NEWLINE)
+
+
+# Binary stdout: replies are already bytes, so the text layer is skipped
+_stdout = sys.stdout.buffer
+
+
+async def handle_line(line: bytes) -> None:
+    """Processes request in a worker thread and writes the response"""
+    # Tools block on MongoDB, HTTP and osascript, so they run off the event loop
+    response = await asyncio.to_thread(process_line, line)
+    # Writes happen on the event loop thread with no await in between,
+    # so responses of concurrent requests never interleave
+    # One write per reply: the line already ends with its newline
+    _stdout.write(response)
+    _stdout.flush()
+
+
+_LINE_TOO_LONG = orjson.dumps(
+    {
+        "jsonrpc": "2.0",
+        "id": None,
+        "error": {
+            "code": -32600,
+            "message": f"Invalid Request: line longer than {STDIN_LINE_LIMIT} bytes",
+        },
+    },
+    option=orjson.OPT_APPEND_NEWLINE,
+)
+
+
+async def read_request_line(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """Reads one stdin line; None for a line longer than STDIN_LINE_LIMIT"""
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        # Last line without newline, or b"" at end of input
+        return e.partial
+    except asyncio.LimitOverrunError as e:
+        consumed = e.consumed
+    # Drop the oversized line up to its newline, one buffer at a time,
+    # so the next request is read from its own start
+    while True:
+        await reader.readexactly(consumed)
+        try:
+            await reader.readuntil(b"\n")
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+
+
+async def main_async() -> None:
+    """Reads JSON-RPC requests from stdin and handles them concurrently"""
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=TOOL_WORKERS))
+    reader = asyncio.StreamReader(limit=STDIN_LINE_LIMIT)
+    try:
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+        )
+        readline = lambda: read_request_line(reader)
+    except ValueError:
+        # stdin is a regular file (e.g. server.py < requests.txt), not a pipe
+        readline = lambda: asyncio.to_thread(sys.stdin.buffer.readline)
+
+    in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+    pending = set()
+
+    def on_done(task: asyncio.Task) -> None:
+        pending.discard(task)
+        in_flight.release()
 
     # Читаем запросы из stdin и отправляем ответы в stdout
-    for line in sys.stdin:
+    while True:
+        line = await readline()
+        if line is None:
+            # Answer the oversized request and keep serving the next ones
+            _stdout.write(_LINE_TOO_LONG)
+            _stdout.flush()
+            continue
+        if not line:
+            break
         if not line.strip():
             continue
 
-        try:
-            request = json.loads(line)
-            response = handle_request(request)
-            print(json.dumps(response), flush=True)
-        except json.JSONDecodeError as e:
-            error_response = {
-                "jsonrpc": "2.0",
-                "id": None,
-                "error": {
-                    "code": -32700,
-                    "message": f"Parse error: {str(e)}",
-                },
-            }
-            print(json.dumps(error_response), flush=True)
-        except Exception as e:
-            error_response = {
-                "jsonrpc": "2.0",
-                "id": None,
-                "error": {
-                    "code": -32603,
-                    "message": f"Internal error: {str(e)}",
-                },
-            }
-            print(json.dumps(error_response), flush=True)
+        # Responses carry the request id, so they may be sent out of order
+        await in_flight.acquire()
+        task = asyncio.create_task(handle_line(line))
+        pending.add(task)
+        task.add_done_callback(on_done)
+
+    # stdin closed: finish requests that are still running
+    if pending:
+        await asyncio.gather(*pending)
+
+
+def main():
+    """Main function - processes JSON-RPC requests via stdio"""
+    print("MCP Mac Apps Server (Python) started", file=sys.stderr)
+
+    if uvloop is not None:
+        uvloop.install()
+    asyncio.run(main_async())
 
 
 if __name__ == "__main__":
@@ -4,17 +4,23 @@ Voice client for managing Mac applications through MCP
 Uses Ollama for understanding commands and MCP tools for management
 """
 
-import requests
-import json
+import os
 import subprocess
 import sys
-import os
 import time
 import select
 
-MCP_SERVER_PATH = os.path.join(os.path.dirname(__file__), "src", "server.py")
-OLLAMA_API_URL = "http://localhost:11434"
-OLLAMA_MODEL = "llama3.2"
+import orjson
+
+# MCP transport and Ollama request handling are shared with the text client
+from mcp_client import (
+    OLLAMA_API_URL,
+    OLLAMA_MODEL,
+    ask_ollama,
+    configure_logging,
+    prefetch_mcp_tools,
+    warm_up_ollama,
+)
 
 try:
     import speech_recognition as sr
@@ -24,6 +30,16 @@ except ImportError:
     print("⚠️  speech_recognition is not installed. Install: pip install SpeechRecognition")
     print("   For voice input, pyaudio is also needed: pip install pyaudio")
 
+try:
+    import vosk
+    VOSK_AVAILABLE = True
+except ImportError:
+    # Offline recognition is optional; Google Speech Recognition is used instead
+    VOSK_AVAILABLE = False
+
+# Path to an unpacked Vosk model; without it the small English model is fetched by language
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH")
+
 try:
     import pyttsx3
     TTS_AVAILABLE = True
@@ -33,21 +49,134 @@ except ImportError:
     print("   Or use macOS built-in say (already available)")
 
 
+# Longest text spoken for a tool result; say reads in real time, so a long
+# line (e.g. a list of documents) would take minutes
+SPEECH_MAX_CHARS = 240
+
+# say process of the last answer; it plays while the next command is awaited
+_tts_proc = None
+
+
+def _say(text):
+    """Starts macOS say without waiting for it to finish"""
+    global _tts_proc
+    stop_speaking()
+    _tts_proc = subprocess.Popen(["say", text])
+
+
+def stop_speaking():
+    """Interrupts answer that is still being spoken"""
+    if _tts_proc is not None and _tts_proc.poll() is None:
+        _tts_proc.terminate()
+
+
+def wait_for_tts():
+    """Waits until the last answer has been spoken"""
+    if _tts_proc is not None:
+        _tts_proc.wait()
+
+
+# pyttsx3 engine, initialized on first use; False once initialization failed
+_tts_engine = None
+
+
+def _get_tts_engine():
+    """Returns shared pyttsx3 engine, or None if pyttsx3 can't be used"""
+    global _tts_engine
+    if _tts_engine is None:
+        _tts_engine = False
+        if TTS_AVAILABLE:
+            try:
+                # Loading drivers and voices is slow, so it is done only once
+                _tts_engine = pyttsx3.init()
+            except Exception as e:
+                print(f"TTS error: {e}")
+    return _tts_engine or None
+
+
+def _speech_text(text):
+    """Returns first line of text, cut to SPEECH_MAX_CHARS at a word boundary"""
+    line = text.partition('\n')[0]
+    if len(line) > SPEECH_MAX_CHARS:
+        line = line[:SPEECH_MAX_CHARS].rsplit(' ', 1)[0]
+    return line
+
+
 def speak(text, use_system=True):
     """Converts text to speech"""
     if use_system:
         # Use built-in macOS say command
-        subprocess.run(["say", text], check=False)
-    elif TTS_AVAILABLE:
+        _say(text)
+    else:
+        engine = _get_tts_engine()
+        if engine is None:
+            _say(text)
+            return
         try:
-            engine = pyttsx3.init()
             engine.say(text)
             engine.runAndWait()
         except Exception as e:
             print(f"TTS error: {e}")
-            subprocess.run(["say", text], check=False)
+            _say(text)
+
+
+_SEPARATOR = "-" * 60
+
+# Seconds to wait for speech after the key press, and maximum phrase length:
+# commands are short, so a missed or endless phrase is cut off early
+LISTEN_TIMEOUT = 5
+PHRASE_TIME_LIMIT = 15
+
+# Recognizer and microphone are created once per session, see calibrate_microphone()
+_recognizer = None
+_microphone = None
+
+
+def calibrate_microphone():
+    """Creates recognizer and microphone and adapts to ambient noise once"""
+    global _recognizer, _microphone
+    recognizer = sr.Recognizer()
+    microphone = sr.Microphone()
+    print("🔇 Calibrating microphone, stay quiet for a moment...")
+    with microphone as source:
+        recognizer.adjust_for_ambient_noise(source, duration=0.5)
+    # Start from the measured threshold and let it follow noise changes
+    # during the session (adjusted while listening, at no extra delay)
+    recognizer.dynamic_energy_threshold = True
+    _recognizer, _microphone = recognizer, microphone
+
+
+# Loaded once by load_vosk_model(); None means Google recognition is used
+_vosk_model = None
+
+
+def load_vosk_model():
+    """Loads Vosk model for offline recognition once per session"""
+    global _vosk_model
+    vosk.SetLogLevel(-1)
+    if VOSK_MODEL_PATH:
+        _vosk_model = vosk.Model(VOSK_MODEL_PATH)
     else:
-        subprocess.run(["say", text], check=False)
+        _vosk_model = vosk.Model(lang="en-us")
+
+
+def transcribe_stream(source, timeout=LISTEN_TIMEOUT + PHRASE_TIME_LIMIT):
+    """Recognizes speech with Vosk while it is being recorded"""
+    # Frames go to the recognizer as they are read, so recognition is done
+    # almost as soon as the user stops speaking
+    recognizer = vosk.KaldiRecognizer(_vosk_model, source.SAMPLE_RATE)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        chunk = source.stream.read(source.CHUNK)
+        # True at the end of an utterance (detected by Vosk on silence)
+        if recognizer.AcceptWaveform(chunk):
+            text = orjson.loads(recognizer.Result()).get("text", "")
+            if text:
+                return text
+    text = orjson.loads(recognizer.FinalResult()).get("text", "")
+    if not text:
+        raise sr.WaitTimeoutError()
+    return text
 
 
 def listen(use_microphone=True, activation_key='space'):
@@ -67,8 +196,6 @@ def listen(use_microphone=True, activation_key='space'):
     else:
         print(f"⌨️  Press {activation_key.upper()} to start voice recording")
     
-    # Use threading for non-blocking key reading
-    import select
     import termios
     import tty
     
@@ -78,22 +205,24 @@ def listen(use_microphone=True, activation_key='space'):
         tty.setcbreak(sys.stdin.fileno())
         
         while True:
-            # Check if there's input
-            if select.select([sys.stdin], [], [], 0)[0]:
-                key = sys.stdin.read(1)
-                
-                # Space or Enter activates recording
-                if key in [' ', '\n', '\r']:
-                    print("\n🎤 Recording... (speak, press Enter when finished)")
-                    break
-                # 'q' to exit
-                elif key == 'q':
-                    termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
-                    return None
-                # Any other key - text mode
-                elif key == '\x1b':  # ESC
-                    termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
-                    return input("\nYou: ")
+            # Block until a key is pressed: no CPU is used while waiting
+            select.select([sys.stdin], [], [])
+            key = sys.stdin.read(1)
+            
+            # Space or Enter activates recording
+            if key in [' ', '\n', '\r']:
+                # Don't record the previous answer
+                stop_speaking()
+                print("\n🎤 Recording... (speak, press Enter when finished)")
+                break
+            # 'q' to exit
+            elif key == 'q':
+                termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
+                return None
+            # Any other key - text mode
+            elif key == '\x1b':  # ESC
+                termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
+                return input("\nYou: ")
     except (ImportError, AttributeError):
         # Fallback for systems without termios (e.g., Windows)
         key = input("Press Enter to record voice: ")
@@ -107,19 +236,23 @@ def listen(use_microphone=True, activation_key='space'):
             pass
     
     # Start recording
-    r = sr.Recognizer()
+    if _recognizer is None:
+        calibrate_microphone()
+    r = _recognizer
     
-    with sr.Microphone() as source:
-        # Adapt to ambient noise (faster for button activation)
-        r.adjust_for_ambient_noise(source, duration=0.3)
-        
+    # Noise level was measured at startup, so recording starts immediately
+    with _microphone as source:
         try:
-            # Listen with increased time limit since user already pressed button
-            audio = r.listen(source, timeout=30, phrase_time_limit=30)
-            print("🔄 Recognizing speech...")
-            
-            # Use Google Speech Recognition (requires internet)
-            text = r.recognize_google(audio, language="en-US")
+            if _vosk_model is not None:
+                text = transcribe_stream(source)
+            else:
+                audio = r.listen(
+                    source, timeout=LISTEN_TIMEOUT, phrase_time_limit=PHRASE_TIME_LIMIT
+                )
+                print("🔄 Recognizing speech...")
+                
+                # Use Google Speech Recognition (requires internet)
+                text = r.recognize_google(audio, language="en-US")
             print(f"📝 Recognized: {text}")
             return text
             
@@ -131,324 +264,22 @@ def listen(use_microphone=True, activation_key='space'):
             return None
         except sr.RequestError as e:
             print(f"❌ Speech recognition service error: {e}")
-            print("💡 Use text input or install offline recognition")
+            print("💡 Use text input or install offline recognition: pip install vosk")
             return None
 
 
-def call_mcp_tool(tool_name, arguments):
-    """Calls MCP tool via JSON-RPC"""
-    request = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "tools/call",
-        "params": {
-            "name": tool_name,
-            "arguments": arguments
-        }
-    }
-    
-    try:
-        process = subprocess.Popen(
-            ["python3", MCP_SERVER_PATH],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        request_json = json.dumps(request) + "\n"
-        stdout, stderr = process.communicate(input=request_json, timeout=10)
-        
-        for line in stdout.split('\n'):
-            if line.strip():
-                try:
-                    response = json.loads(line)
-                    if "result" in response:
-                        content = response["result"].get("content", [])
-                        if content:
-                            return content[0].get("text", "")
-                    if "error" in response:
-                        return f"Error: {response['error'].get('message', 'Unknown error')}"
-                except json.JSONDecodeError:
-                    continue
-        
-        return "No response from MCP server"
-        
-    except subprocess.TimeoutExpired:
-        process.kill()
-        return "Timeout when calling MCP tool"
-    except Exception as e:
-        return f"Error calling MCP tool: {str(e)}"
-
-
-def extract_search_query(user_query):
-    print(f"🔍 Extracting query from: '{user_query}'")
-    """Extracts search query from user text"""
-    import re
-    if not user_query:
-        return None
-    
-    # Patterns for finding query (more precise, using greedy quantifier)
-    patterns = [
-        r'find\s+(.+?)\s+in\s+google',
-        r'search\s+(.+?)\s+in\s+google',
-        r'search\s+for\s+(.+?)\s+in\s+google',
-        r'look\s+up\s+(.+?)\s+in\s+google',
-        r'google\s+(.+?)$',
-    ]
-    
-    query_lower = user_query.lower()
-    for pattern in patterns:
-        match = re.search(pattern, query_lower, re.IGNORECASE)
-        if match:
-            query = match.group(1).strip()
-            # Remove extra words at the end (in case pattern captured extra)
-            query = re.sub(r'\s+in\s+google.*$', '', query, flags=re.IGNORECASE)
-            if query:
-                return query.strip()
-    
-    # If pattern with "in google" not found, try just "find X" or "search X"
-    simple_patterns = [
-        r'^find\s+(.+)$',
-        r'^search\s+(.+)$',
-        r'^search\s+for\s+(.+)$',
-        r'^look\s+up\s+(.+)$',
-    ]
-    
-    for pattern in simple_patterns:
-        match = re.search(pattern, query_lower, re.IGNORECASE)
-        if match:
-            query = match.group(1).strip()
-            # Remove "in google" if present
-            query = re.sub(r'\s+in\s+google.*$', '', query, flags=re.IGNORECASE)
-            if query:
-                return query.strip()
-    
-    # If no pattern found, return entire query, removing words "find", "search", "in google"
-    query = user_query
-    query = re.sub(r'^find\s+', '', query, flags=re.IGNORECASE)
-    query = re.sub(r'^search\s+', '', query, flags=re.IGNORECASE)
-    query = re.sub(r'^search\s+for\s+', '', query, flags=re.IGNORECASE)
-    query = re.sub(r'^look\s+up\s+', '', query, flags=re.IGNORECASE)
-    query = re.sub(r'\s+in\s+google.*$', '', query, flags=re.IGNORECASE)
-    result = query.strip() if query.strip() else None
-    return result
-
-
-def list_mcp_tools():
-    """Gets list of available MCP tools"""
-    request = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "tools/list",
-        "params": {}
-    }
-    
-    try:
-        process = subprocess.Popen(
-            ["python3", MCP_SERVER_PATH],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        request_json = json.dumps(request) + "\n"
-        stdout, stderr = process.communicate(input=request_json, timeout=10)
-        
-        for line in stdout.split('\n'):
-            if line.strip():
-                try:
-                    response = json.loads(line)
-                    if "result" in response and "tools" in response["result"]:
-                        return response["result"]["tools"]
-                except json.JSONDecodeError:
-                    continue
-        
-        return []
-        
-    except Exception as e:
-        print(f"Error getting list of tools: {e}", file=sys.stderr)
-        return []
-
-
-def ask_ollama_with_tools(user_query, verbose=False):
-    """Uses Ollama to understand the request and call appropriate MCP tools"""
-    
-    tools = list_mcp_tools()
-    tools_description = "\n".join([
-        f"- {tool['name']}: {tool['description']}"
-        for tool in tools
-    ])
-    
-    system_prompt = f"""You are an assistant that can manage Mac applications through MCP tools.
-
-Available tools:
-{tools_description}
-
-When the user asks to open an application, perform an action, or get information, determine which tool to use and return JSON in the format:
-{{
-    "tool": "tool_name",
-    "arguments": {{"parameter": "value"}}
-}}
-
-If the request doesn't require using tools, just respond with regular text.
-
-Examples:
-- "Open Calculator" -> {{"tool": "open_application", "arguments": {{"appName": "Calculator"}}}}
-- "Close Safari" -> {{"tool": "quit_application", "arguments": {{"appName": "Safari"}}}}
-- "What applications are running?" -> {{"tool": "get_running_applications", "arguments": {{}}}}
-- "Open MongoDB Compass" -> {{"tool": "open_application", "arguments": {{"appName": "MongoDB Compass"}}}}
-- "Create database test" -> {{"tool": "mongodb_create_database", "arguments": {{"databaseName": "test"}}}}
-- "Create collection users in database test" -> {{"tool": "mongodb_create_collection", "arguments": {{"databaseName": "test", "collectionName": "users"}}}}
-- "Add document {{\"name\": \"John\"}} to collection users in database test" -> {{"tool": "mongodb_insert_document", "arguments": {{"databaseName": "test", "collectionName": "users", "document": "{{\\\"name\\\": \\\"John\\\"}}"}}}}
-- "Find apple image in Google" -> {{"tool": "search_google_in_safari", "arguments": {{"query": "apple image"}}}}
-- "Search Google for Python" -> {{"tool": "search_google_in_safari", "arguments": {{"query": "Python"}}}}
-- "Find information about MCP in Google" -> {{"tool": "search_google_in_safari", "arguments": {{"query": "MCP"}}}}
-
-IMPORTANT: 
-- For search_google_in_safari always extract the search query from the user's text and pass it in the "query" parameter. If the user says "find X in Google" or "search Y", then query should be "X" or "Y".
-- ALWAYS return ONLY a valid JSON object in the format {{"tool": "...", "arguments": {{...}}}}. DO NOT return just text or tool name without JSON. DO NOT return empty arguments.
-
-Respond ONLY with JSON, without additional explanations or text."""
-
-    try:
-        response = requests.post(
-            f"{OLLAMA_API_URL}/api/generate",
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": f"{system_prompt}\n\nUser: {user_query}\nAssistant:",
-                "stream": False,
-                "options": {
-                    "temperature": 0.3,
-                    "max_tokens": 500
-                }
-            },
-            timeout=30
-        )
-        
-        if response.status_code != 200:
-            return f"Ollama error: {response.status_code}", False
-        
-        result = response.json()
-        answer = result.get("response", "").strip()
-        
-        if verbose:
-            print(f"🤖 Ollama response: {answer}")
-        
-        # Try to parse JSON
-        try:
-            import re
-            json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-            json_matches = re.findall(json_pattern, answer, re.DOTALL)
-            print(f"🔍 JSON matches: {json_matches}")
-            
-            for json_str in json_matches:
-                try:
-                    tool_call = json.loads(json_str)
-                    if "tool" in tool_call:
-                        tool_name = tool_call["tool"]
-                        tool_args = tool_call.get("arguments", {})
-                        
-                        print(f"🔧 tool_call: {tool_call}")
-                        print(f"🔧 tool_name: {tool_name}")
-                        
-                        # Fallback: if arguments are empty for search_google_in_safari, extract query from user_query
-                        if tool_name == "search_google_in_safari":
-                            print(f"🔍 ==========tool_name: {tool_name}")
-                            # Check if query is in arguments
-                            current_query = None
-                            if tool_args and isinstance(tool_args, dict):
-                                current_query = tool_args.get("query")
-                            
-                            print(f"🔍 Check: tool_args={tool_args}, current_query={current_query}")
-                            
-                            if not current_query:
-                                # Try to extract search query from original request
-                                print(f"🔍 Extracting query from: '{user_query}'")
-                                query = extract_search_query(user_query)
-                                print(f"🔍 Extraction result: '{query}'")
-                                
-                                if query:
-                                    # Make sure tool_args is a dictionary
-                                    if not tool_args or not isinstance(tool_args, dict):
-                                        tool_args = {}
-                                    tool_args["query"] = query
-                                    print(f"✅ Set query: '{query}'")
-                                else:
-                                    print(f"⚠️ Failed to extract query from: '{user_query}'")
-                                    # As last resort, use entire query, removing service words
-                                    fallback_query = user_query.replace("find", "").replace("search", "").replace("in google", "").replace("for", "").strip()
-                                    if fallback_query:
-                                        if not tool_args or not isinstance(tool_args, dict):
-                                            tool_args = {}
-                                        tool_args["query"] = fallback_query
-                                        print(f"✅ Used fallback query: '{fallback_query}'")
-                        
-                        if verbose:
-                            print(f"🔧 Calling tool: {tool_name}")
-                            print(f"📝 Arguments: {tool_args}")
-                        
-                        result = call_mcp_tool(tool_name, tool_args)
-                        return result, True
-                except json.JSONDecodeError:
-                    continue
-            
-            # Try to parse entire response as JSON
-            tool_call = json.loads(answer)
-            print(f"🔧 tool_call: {tool_call}")
-            if "tool" in tool_call:
-                tool_name = tool_call["tool"]
-                tool_args = tool_call.get("arguments", {})
-                
-                # Fallback: if arguments are empty for search_google_in_safari, extract query from user_query
-                if tool_name == "search_google_in_safari" and (not tool_args or not tool_args.get("query")):
-                    query = extract_search_query(user_query)
-                    if query:
-                        if not tool_args:
-                            tool_args = {}
-                        tool_args["query"] = query
-                        print(f"🔍 Extracted search query from text: '{query}'")
-                    else:
-                        print(f"⚠️ Failed to extract search query from: '{user_query}'")
-                
-                if verbose:
-                    print(f"🔧 Calling tool: {tool_name}")
-                    print(f"📝 Arguments: {tool_args}")
-                
-                result = call_mcp_tool(tool_name, tool_args)
-                return result, True
-                    
-        except (json.JSONDecodeError, KeyError):
-            print(f"🔧 Failed to parse JSON: {answer}")
-            # If not JSON, check if it's just a tool name
-            answer_lower = answer.lower().strip()
-            if "search_google" in answer_lower or answer_lower == "search_google_in_safari":
-                # Try to extract search query from original request
-                query = extract_search_query(user_query)
-                if query:
-                    if verbose:
-                        print(f"🔧 Calling tool: search_google_in_safari")
-                        print(f"📝 Arguments: {{'query': '{query}'}}")
-                    result = call_mcp_tool("search_google_in_safari", {"query": query})
-                    return result, True
-            pass
-        
-        return answer, False
-        
-    except requests.exceptions.ConnectionError:
-        return "❌ Failed to connect to Ollama. Start: ollama serve", False
-    except Exception as e:
-        return f"Error: {str(e)}", False
-
-
 def main():
-    print("🎤 Voice assistant for managing Mac applications")
-    print("=" * 60)
-    print(f"📦 Model: {OLLAMA_MODEL}")
-    print(f"🌐 Ollama: {OLLAMA_API_URL}")
-    print("=" * 60)
-    print()
+    configure_logging()
+    prefetch_mcp_tools()
+    warm_up_ollama()
+    
+    print(
+        "🎤 Voice assistant for managing Mac applications\n"
+        f"{'=' * 60}\n"
+        f"📦 Model: {OLLAMA_MODEL}\n"
+        f"🌐 Ollama: {OLLAMA_API_URL}\n"
+        f"{'=' * 60}\n"
+    )
     
     # Check availability
     if not SPEECH_RECOGNITION_AVAILABLE:
@@ -463,6 +294,23 @@ def main():
         print("✅ Voice input available")
         print("✅ Voice output available (via macOS say)")
         print()
+        try:
+            calibrate_microphone()
+        except Exception as e:
+            print(f"❌ Microphone is not available: {e}")
+            print("📝 Text input will be used now")
+            print()
+            use_voice_input = False
+    
+    # Offline recognition unless cloud recognition was asked for explicitly
+    if use_voice_input and VOSK_AVAILABLE and "--cloud-asr" not in sys.argv[1:]:
+        try:
+            load_vosk_model()
+            print("✅ Offline speech recognition (Vosk)")
+        except Exception as e:
+            print(f"⚠️  Vosk model could not be loaded: {e}")
+            print("   Google Speech Recognition will be used")
+        print()
     
     while True:
         try:
@@ -482,27 +330,17 @@ def main():
                 print("👋 Goodbye!")
                 break
             
-            print(f"\n💬 Request: {query}")
-            print("-" * 60)
+            # One write per message instead of a print per line
+            print(f"\n💬 Request: {query}\n{_SEPARATOR}")
             
             # Process request
-            result, is_action = ask_ollama_with_tools(query, verbose=True)
-            
-            print(f"\n📋 Result: {result}")
+            result, _ = ask_ollama(query)
             
-            # Voice output of result
-            if is_action:
-                # For actions, speak brief answer
-                speak(result.split('\n')[0] if '\n' in result else result)
-            else:
-                # For regular answers, speak entire text (if short)
-                if len(result) < 200:
-                    speak(result)
-                else:
-                    speak("Result shown on screen")
+            print(f"\n📋 Result: {result}\n")
             
-            print()
-            time.sleep(0.5)  # Small pause between commands
+            # Voice output of result: actions and answers alike are cut to
+            # a short first line, the full text is on screen
+            speak(_speech_text(result))
             
         except KeyboardInterrupt:
             print("\n\n👋 Interrupted by user")
@@ -512,7 +350,11 @@ def main():
             error_msg = f"Error: {str(e)}"
             print(f"\n❌ {error_msg}")
             speak("An error occurred")
-            time.sleep(1)
+            # Brief pause so a persistent error doesn't spin the loop
+            time.sleep(0.1)
+    
+    # Let the farewell finish before the process exits
+    wait_for_tts()
 
 
 if __name__ == "__main__":